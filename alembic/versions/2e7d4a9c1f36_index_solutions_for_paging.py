@@ -0,0 +1,27 @@
+"""Index solutions for paging
+
+Revision ID: 2e7d4a9c1f36
+Revises: 6b5f0a2d9e81
+Create Date: 2026-10-18 16:42:37.918204
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2e7d4a9c1f36"
+down_revision = "6b5f0a2d9e81"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # solutions are listed by quiz or by user, each in id order
+    op.create_index("ix_solution_quiz_id", "solution", ["quiz", "id"])
+    op.create_index("ix_solution_user_id", "solution", ["user", "id"])
+    op.drop_index("ix_solution_quiz", table_name="solution")
+
+
+def downgrade() -> None:
+    op.create_index("ix_solution_quiz", "solution", ["quiz"])
+    op.drop_index("ix_solution_user_id", table_name="solution")
+    op.drop_index("ix_solution_quiz_id", table_name="solution")
@@ -0,0 +1,62 @@
+"""Add question and answer positions
+
+Revision ID: 5d2c8e41a7b3
+Revises: b8a0039077de
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d2c8e41a7b3"
+down_revision = "b8a0039077de"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "question",
+        sa.Column("position", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "answer",
+        sa.Column("position", sa.Integer(), server_default="0", nullable=False),
+    )
+    # existing rows keep the order they were inserted in, which is the order
+    # they have been served in so far
+    op.execute(
+        """
+        UPDATE question SET position = ranked.position
+        FROM (
+            SELECT question.id,
+                   row_number() OVER (
+                       PARTITION BY quiz_questions.quiz_id ORDER BY question.ctid
+                   ) - 1 AS position
+            FROM question
+            JOIN quiz_questions ON quiz_questions.question_id = question.id
+        ) AS ranked
+        WHERE question.id = ranked.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE answer SET position = ranked.position
+        FROM (
+            SELECT answer.id,
+                   row_number() OVER (
+                       PARTITION BY question_answers.question_id ORDER BY answer.ctid
+                   ) - 1 AS position
+            FROM answer
+            JOIN question_answers ON question_answers.answer_id = answer.id
+        ) AS ranked
+        WHERE answer.id = ranked.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("answer", "position")
+    op.drop_column("question", "position")
@@ -0,0 +1,76 @@
+"""Add quiz stats tables
+
+Revision ID: 6b5f0a2d9e81
+Revises: c47a9d0e5f12
+Create Date: 2026-10-18 14:05:12.402118
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6b5f0a2d9e81"
+down_revision = "c47a9d0e5f12"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "quiz_stats",
+        sa.Column("quiz_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("submissions", sa.Integer(), nullable=False),
+        sa.Column("total_score_sum", postgresql.DOUBLE_PRECISION(), nullable=False),
+        sa.Column("min_total_score", postgresql.DOUBLE_PRECISION(), nullable=False),
+        sa.Column("max_total_score", postgresql.DOUBLE_PRECISION(), nullable=False),
+        sa.ForeignKeyConstraint(["quiz_id"], ["quiz.id"]),
+        sa.PrimaryKeyConstraint("quiz_id"),
+    )
+    op.create_table(
+        "question_stats",
+        sa.Column("quiz_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("question_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("score_sum", postgresql.DOUBLE_PRECISION(), nullable=False),
+        sa.ForeignKeyConstraint(["quiz_id"], ["quiz.id"]),
+        sa.ForeignKeyConstraint(["question_id"], ["question.id"]),
+        sa.PrimaryKeyConstraint("quiz_id", "question_id"),
+    )
+    op.create_table(
+        "answer_stats",
+        sa.Column("quiz_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("question_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("selections", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["quiz_id"], ["quiz.id"]),
+        sa.ForeignKeyConstraint(["question_id"], ["question.id"]),
+        sa.PrimaryKeyConstraint("quiz_id", "question_id", "position"),
+    )
+
+    op.execute(
+        """
+        INSERT INTO quiz_stats
+        SELECT quiz, count(*), sum(total_score), min(total_score), max(total_score)
+        FROM solution
+        GROUP BY quiz
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO question_stats
+        SELECT s.quiz, q.id, sum(s.scores[q.position + 1])
+        FROM solution s
+        JOIN quiz_questions qq ON qq.quiz_id = s.quiz
+        JOIN question q ON q.id = qq.question_id
+        GROUP BY s.quiz, q.id
+        """
+    )
+    # selected answers were never stored, so answer_stats only counts
+    # solutions submitted from now on
+
+
+def downgrade() -> None:
+    op.drop_table("answer_stats")
+    op.drop_table("question_stats")
+    op.drop_table("quiz_stats")
@@ -0,0 +1,23 @@
+"""Index quizzes by owner and id
+
+Revision ID: 8d3b6f1e4a20
+Revises: 2e7d4a9c1f36
+Create Date: 2026-10-18 18:21:54.306617
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d3b6f1e4a20"
+down_revision = "2e7d4a9c1f36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the solutions of an owner's quizzes are listed quiz by quiz in id order
+    op.create_index("ix_quiz_owner_id", "quiz", ["owner", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_quiz_owner_id", table_name="quiz")
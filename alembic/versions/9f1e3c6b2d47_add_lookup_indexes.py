@@ -0,0 +1,56 @@
+"""Add lookup indexes
+
+Revision ID: 9f1e3c6b2d47
+Revises: 5d2c8e41a7b3
+Create Date: 2026-10-18 11:02:17.604152
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9f1e3c6b2d47"
+down_revision = "5d2c8e41a7b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # /list/quiz/mine: owner = ? ORDER BY name, id
+    op.create_index("ix_quiz_owner_name_id", "quiz", ["owner", "name", "id"])
+    # /list/quiz/todo: published AND owner != ? ORDER BY name, id
+    op.create_index(
+        "ix_quiz_published_name_id",
+        "quiz",
+        ["name", "id"],
+        postgresql_where=sa.text("published"),
+    )
+
+    # concurrent submissions may have stored a quiz twice for the same user,
+    # keep the first one before enforcing one solution per user and quiz
+    op.execute(
+        """
+        DELETE FROM solution
+        USING solution AS earlier
+        WHERE solution."user" = earlier."user"
+          AND solution.quiz = earlier.quiz
+          AND solution.ctid > earlier.ctid
+        """
+    )
+    op.create_unique_constraint("solution_user_quiz_key", "solution", ["user", "quiz"])
+    # solutions of the quizzes a user owns
+    op.create_index("ix_solution_quiz", "solution", ["quiz"])
+
+    # reverse lookups through the join tables (and their foreign keys)
+    op.create_index("ix_quiz_questions_question_id", "quiz_questions", ["question_id"])
+    op.create_index("ix_question_answers_answer_id", "question_answers", ["answer_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_question_answers_answer_id", table_name="question_answers")
+    op.drop_index("ix_quiz_questions_question_id", table_name="quiz_questions")
+    op.drop_index("ix_solution_quiz", table_name="solution")
+    op.drop_constraint("solution_user_quiz_key", "solution", type_="unique")
+    op.drop_index("ix_quiz_published_name_id", table_name="quiz")
+    op.drop_index("ix_quiz_owner_name_id", table_name="quiz")
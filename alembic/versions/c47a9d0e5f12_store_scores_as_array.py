@@ -0,0 +1,60 @@
+"""Store scores as array
+
+Revision ID: c47a9d0e5f12
+Revises: 9f1e3c6b2d47
+Create Date: 2026-10-18 12:40:55.917023
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c47a9d0e5f12"
+down_revision = "9f1e3c6b2d47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "solution",
+        sa.Column("score_list", postgresql.ARRAY(postgresql.DOUBLE_PRECISION())),
+    )
+    op.add_column("solution", sa.Column("total_score", postgresql.DOUBLE_PRECISION()))
+    # scores used to be written as a JSON encoded string inside the JSONB column
+    op.execute(
+        """
+        UPDATE solution SET score_list = ARRAY(
+            SELECT score.value::double precision
+            FROM jsonb_array_elements_text(
+                CASE WHEN jsonb_typeof(scores) = 'string'
+                     THEN (scores #>> '{}')::jsonb
+                     ELSE scores
+                END
+            ) WITH ORDINALITY AS score(value, n)
+            ORDER BY score.n
+        )
+        """
+    )
+    op.execute(
+        "UPDATE solution SET total_score = "
+        "(SELECT avg(score) FROM unnest(score_list) AS score)"
+    )
+    op.drop_column("solution", "scores")
+    op.alter_column("solution", "score_list", new_column_name="scores")
+    op.alter_column("solution", "scores", nullable=False)
+    op.alter_column("solution", "total_score", nullable=False)
+
+
+def downgrade() -> None:
+    op.add_column(
+        "solution",
+        sa.Column("score_json", postgresql.JSONB(astext_type=sa.Text())),
+    )
+    op.execute("UPDATE solution SET score_json = to_jsonb(array_to_json(scores)::text)")
+    op.drop_column("solution", "total_score")
+    op.drop_column("solution", "scores")
+    op.alter_column("solution", "score_json", new_column_name="scores")
+    op.alter_column("solution", "scores", nullable=False)
@@ -0,0 +1,95 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks run the real app under uvicorn, in a separate process, against a
+throwaway PostgreSQL instance from ``testing.postgresql`` migrated the same way
+as in the tests. Run them from the repository root, e.g.
+``python -m benchmarks.login_storm``.
+"""
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List
+
+import requests
+import testing.postgresql
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from tests.conftest import upgrade_head
+
+
+@contextlib.contextmanager
+def database() -> Iterator[Engine]:
+    postgresql = testing.postgresql.Postgresql()
+    engine = create_engine(
+        "postgresql://{user}@{host}:{port}/{database}".format(**postgresql.dsn())
+    )
+    upgrade_head(engine)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        postgresql.stop()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(engine: Engine, **env: str) -> Iterator[str]:
+    """Serve the app with uvicorn against ``engine``, yielding its base url.
+
+    Extra keyword arguments are passed to the server as environment variables.
+    """
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)]
+        + ["--log-level", "warning"],
+        env={**os.environ, "DATABASE_URL": str(engine.url), **env},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            try:
+                requests.get(base_url)
+                break
+            except requests.ConnectionError:
+                if server.poll() is not None:
+                    raise RuntimeError("server failed to start")
+                time.sleep(0.05)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def login(base_url: str, email: str, password: str) -> Dict[str, str]:
+    """Sign up (if needed) and log in, returning the authorization headers."""
+    credentials = {"email": email, "password": password}
+    requests.post(f"{base_url}/signup", json=credentials)
+    response = requests.post(f"{base_url}/login", json=credentials)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summary(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50) * 1000,
+        "p95": percentile(samples, 95) * 1000,
+        "p99": percentile(samples, 99) * 1000,
+    }
@@ -0,0 +1,90 @@
+"""Throughput of the read endpoints at 1, 10 and 100 concurrent clients.
+
+Runs once with database calls made inline on the event loop
+(``DB_EXECUTOR_WORKERS=0``, the old behaviour) and once with the database
+executor, so the two can be compared directly.
+
+    python -m benchmarks.concurrency --duration 10
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.common import database, login, serve
+
+QUIZ = {
+    "name": "Benchmark quiz",
+    "questions": [
+        {
+            "question": f"Question {i}",
+            "type": "multi",
+            "answers": [
+                {"answer": f"Answer {j}", "correct": j % 2 == 0} for j in range(5)
+            ],
+        }
+        for i in range(10)
+    ],
+}
+
+
+def seed(base_url: str) -> dict:
+    owner = login(base_url, "owner@example.com", "owner-password")
+    response = requests.post(f"{base_url}/create/quiz", headers=owner, json=QUIZ)
+    quiz_id = response.json()["id"]
+    requests.put(f"{base_url}/publish/quiz", headers=owner, json={"id": quiz_id})
+    return {"quiz_id": quiz_id}
+
+
+def client(base_url: str, headers, quiz_id: str, stop: threading.Event) -> int:
+    completed = 0
+    with requests.Session() as http:
+        while not stop.is_set():
+            http.get(
+                f"{base_url}/view/quiz", headers=headers, json={"id": quiz_id}
+            ).raise_for_status()
+            http.get(f"{base_url}/list/quiz/todo", headers=headers).raise_for_status()
+            completed += 2
+    return completed
+
+
+def run(base_url: str, quiz_id: str, clients: int, duration: float) -> float:
+    headers = login(base_url, "reader@example.com", "reader-password")
+    stop = threading.Event()
+    with ThreadPoolExecutor(clients) as pool:
+        futures = [
+            pool.submit(client, base_url, headers, quiz_id, stop)
+            for _ in range(clients)
+        ]
+        time.sleep(duration)
+        stop.set()
+        return sum(f.result() for f in futures) / duration
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    results = {}
+    with database() as engine:
+        for mode, workers in [("inline", "0"), ("executor", "")]:
+            env = {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "100"}
+            if workers:
+                env["DB_EXECUTOR_WORKERS"] = workers
+            with serve(engine, **env) as base_url:
+                quiz_id = seed(base_url)["quiz_id"]
+                results[mode] = {
+                    clients: run(base_url, quiz_id, clients, args.duration)
+                    for clients in args.clients
+                }
+            engine.execute('TRUNCATE "user", quiz, question, answer CASCADE')
+    print(json.dumps({"requests_per_second": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Stream the export of a quiz with many solutions and watch the server memory.
+
+The solutions are inserted straight into the database, then downloaded from
+``/export/solution/quiz``. The server's peak resident memory should not depend
+on the number of rows.
+
+    python -m benchmarks.export --rows 1000000 --format ndjson
+"""
+import argparse
+import json
+import os
+import time
+
+import requests
+
+from benchmarks.common import database, login, serve
+
+
+def server_memory_kb() -> dict:
+    """Current and peak resident memory of the uvicorn child process."""
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read()
+            if ppid != os.getpid() or b"uvicorn" not in cmdline:
+                continue
+            with open(f"/proc/{pid}/status") as f:
+                status = dict(line.split(":", 1) for line in f)
+        except (OSError, ValueError):
+            continue
+        return {
+            "rss": int(status["VmRSS"].split()[0]),
+            "peak_rss": int(status["VmHWM"].split()[0]),
+        }
+    raise RuntimeError("server process not found")
+
+
+def seed(engine, quiz_id: str, rows: int) -> None:
+    with engine.begin() as connection:
+        connection.execute(
+            """
+            INSERT INTO "user" (id, email, password)
+            SELECT md5(i::text)::uuid, 'student' || i || '@example.com', ''
+            FROM generate_series(1, %s) AS i
+            """,
+            rows,
+        )
+        connection.execute(
+            """
+            INSERT INTO solution (id, "user", quiz, scores, total_score)
+            SELECT md5('solution' || i)::uuid, md5(i::text)::uuid, %s,
+                   ARRAY[1.0, 0.5]::double precision[], 0.75
+            FROM generate_series(1, %s) AS i
+            """,
+            quiz_id,
+            rows,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    args = parser.parse_args()
+
+    quiz = {
+        "name": "Export",
+        "questions": [
+            {
+                "question": f"Question {i}",
+                "type": "single",
+                "answers": [
+                    {"answer": "yes", "correct": True},
+                    {"answer": "no", "correct": False},
+                ],
+            }
+            for i in range(2)
+        ],
+    }
+
+    with database() as engine, serve(engine) as base_url:
+        headers = login(base_url, "owner@example.com", "owner")
+        response = requests.post(f"{base_url}/create/quiz", headers=headers, json=quiz)
+        quiz_id = response.json()["id"]
+        requests.put(f"{base_url}/publish/quiz", headers=headers, json={"id": quiz_id})
+        seed(engine, quiz_id, args.rows)
+
+        before = server_memory_kb()
+        start = time.perf_counter()
+        received = lines = 0
+        with requests.get(
+            f"{base_url}/export/solution/quiz",
+            headers=headers,
+            params={"quiz_id": quiz_id, "format": args.format},
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                received += len(chunk)
+                lines += chunk.count(b"\n")
+        elapsed = time.perf_counter() - start
+        after = server_memory_kb()
+
+    if args.format == "csv":
+        lines -= 1  # header
+    assert lines == args.rows, lines
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "format": args.format,
+                "seconds": elapsed,
+                "rows_per_second": args.rows / elapsed,
+                "megabytes": received / 1e6,
+                "server_peak_rss_before_kb": before["peak_rss"],
+                "server_peak_rss_after_kb": after["peak_rss"],
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Grade synthetic submissions with the compiled answer key.
+
+Compares against the previous answer-by-answer grading loop, no database is
+needed.
+
+    python -m benchmarks.grading --submissions 100000
+"""
+import argparse
+import json
+import random
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+from grading import AnswerKey, compile_question
+from schemas import QuestionType, SolutionAnswer
+
+
+def make_quiz(questions: int) -> list:
+    quiz = []
+    for _ in range(questions):
+        count = random.randint(2, 5)
+        correct = [random.random() < 0.5 for _ in range(count)]
+        correct[random.randrange(count)] = True
+        single = sum(correct) == 1 and random.random() < 0.5
+        quiz.append(
+            SimpleNamespace(
+                id=uuid4(),
+                type=(QuestionType.SINGLE if single else QuestionType.MULTI).value,
+                answers=[SimpleNamespace(correct=c) for c in correct],
+            )
+        )
+    return quiz
+
+
+def make_submission(quiz: list) -> list:
+    answers = []
+    for question in quiz:
+        count = len(question.answers)
+        if question.type == QuestionType.SINGLE.value:
+            indices = [random.randrange(count)]
+        else:
+            indices = random.sample(range(count), random.randint(1, count - 1))
+        answers.append(SolutionAnswer(question_id=question.id, indices=indices))
+    return answers
+
+
+def grade_loop(quiz: list, answers: list) -> list:
+    """The grading done by create_solution before answer keys were compiled."""
+    scores = [0.0] * len(quiz)
+    for i, question in enumerate(quiz):
+        solution_answer = [a for a in answers if a.question_id == question.id][0]
+        try:
+            c_weight = 1.0 / len([a for a in question.answers if a.correct])
+        except ZeroDivisionError:
+            c_weight = 1.0
+        try:
+            w_weight = 1.0 / len([a for a in question.answers if not a.correct])
+        except ZeroDivisionError:
+            w_weight = 1.0
+        for j, answer in enumerate(question.answers):
+            if answer.correct:
+                if j in solution_answer.indices:
+                    scores[i] += c_weight
+            else:
+                if j in solution_answer.indices:
+                    scores[i] -= w_weight
+    return scores
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--submissions", type=int, default=100_000)
+    parser.add_argument("--questions", type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(0)
+    quiz = make_quiz(args.questions)
+    submissions = [make_submission(quiz) for _ in range(args.submissions)]
+
+    start = time.perf_counter()
+    key = AnswerKey(
+        uuid4(),
+        uuid4(),
+        [compile_question(q.id, q.type, [a.correct for a in q.answers]) for q in quiz],
+    )
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [key.grade(s) for s in submissions]
+    compiled_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    looped = [grade_loop(quiz, s) for s in submissions]
+    loop_time = time.perf_counter() - start
+
+    assert compiled == looped
+    print(
+        json.dumps(
+            {
+                "submissions": args.submissions,
+                "questions": args.questions,
+                "compile_ms": compile_time * 1000,
+                "compiled_submissions_per_second": args.submissions / compiled_time,
+                "loop_submissions_per_second": args.submissions / loop_time,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Page through a 10k-row solution listing with and without fast JSON responses.
+
+    python -m benchmarks.listing --rows 10000 --repeat 10
+"""
+import argparse
+import json
+import time
+
+import requests
+
+from benchmarks.common import database, login, serve, summary
+from benchmarks.export import seed
+from pagination import MAX_PAGE_SIZE
+
+QUIZ = {
+    "name": "Listing",
+    "questions": [
+        {
+            "question": "Question",
+            "type": "single",
+            "answers": [
+                {"answer": "yes", "correct": True},
+                {"answer": "no", "correct": False},
+            ],
+        }
+    ],
+}
+
+
+def list_all(base_url: str, headers: dict) -> int:
+    rows, params = 0, {"limit": MAX_PAGE_SIZE}
+    while True:
+        response = requests.get(
+            f"{base_url}/list/solution/quiz", headers=headers, params=params
+        )
+        response.raise_for_status()
+        rows += len(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return rows
+        params["cursor"] = cursor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    with database() as engine:
+        for fast in ("false", "true"):
+            with serve(engine, FAST_JSON_RESPONSES=fast) as base_url:
+                headers = login(base_url, "owner@example.com", "owner")
+                if not results:
+                    response = requests.post(
+                        f"{base_url}/create/quiz", headers=headers, json=QUIZ
+                    )
+                    quiz_id = response.json()["id"]
+                    requests.put(
+                        f"{base_url}/publish/quiz",
+                        headers=headers,
+                        json={"id": quiz_id},
+                    )
+                    seed(engine, quiz_id, args.rows)
+
+                assert list_all(base_url, headers) == args.rows  # warm up
+                samples = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    list_all(base_url, headers)
+                    samples.append(time.perf_counter() - start)
+                results["fast" if fast == "true" else "default"] = {
+                    **summary(samples),
+                    "rows_per_second": args.rows * len(samples) / sum(samples),
+                }
+
+    print(json.dumps({"rows": args.rows, **results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Mixed load test: req/s and p50/p95/p99 latency per endpoint.
+
+Seeds users, quizzes and solutions, then every client signs up and logs in as a
+new user and drives a weighted mix of views, submissions and listings until
+the time is up. Results are written to JSON; pass an earlier result with
+``--compare`` to see how a change moved each endpoint.
+
+    python -m benchmarks.load --clients 20 --duration 30 --output after.json \\
+        --compare before.json
+"""
+import argparse
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+import requests
+from sqlalchemy.orm import sessionmaker
+
+import repository
+from benchmarks.common import database, serve, summary
+from db import create_db_engine
+from models import Quiz, User
+from schemas import ProctoredSolution, QuizCreate, SolutionBatchCreate
+from utils import get_hashed_password
+
+PASSWORD = "password"
+
+# relative frequency of each operation in the client loop
+WEIGHTS = {
+    "view": 40,
+    "submit": 15,
+    "list_todo": 20,
+    "list_mine": 5,
+    "list_submitted": 10,
+    "login": 5,
+    "signup": 5,
+}
+
+
+def make_quiz(i: int, questions: int) -> QuizCreate:
+    return QuizCreate(
+        name=f"Quiz {i:06d}",
+        questions=[
+            {
+                "question": f"Question {j}",
+                "type": "single",
+                "answers": [
+                    {"answer": f"Answer {k}", "correct": k == 0} for k in range(4)
+                ],
+            }
+            for j in range(questions)
+        ],
+    )
+
+
+def seed(url: str, users: int, quizzes: int, questions: int, solutions: int) -> None:
+    engine = create_db_engine(url)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        hashed = get_hashed_password(PASSWORD)
+        session.execute(
+            User.__table__.insert(),
+            [
+                {"email": f"seed{i}@example.com", "password": hashed}
+                for i in range(users)
+            ],
+        )
+        session.commit()
+        user_ids = [u.id for u in session.query(User.id).order_by(User.email)]
+
+        owners = defaultdict(list)
+        for i in range(quizzes):
+            owners[user_ids[i % users]].append(make_quiz(i, questions))
+        for owner, owned in owners.items():
+            repository.import_quizzes(session, owner, owned)
+        session.query(Quiz).update({"published": True})
+        session.commit()
+
+        # spread the solutions over the quizzes, submitted by their owners in
+        # batches like a proctored exam
+        per_quiz = solutions // max(quizzes, 1)
+        for quiz_id, owner in session.query(Quiz.id, Quiz.owner):
+            key = repository.get_answer_key(session, quiz_id)
+            takers = random.sample(
+                [u for u in user_ids if u != owner], min(per_quiz, users - 1)
+            )
+            if not takers:
+                continue
+            batch = SolutionBatchCreate(
+                quiz_id=quiz_id,
+                solutions=[
+                    ProctoredSolution(
+                        user_id=user_id,
+                        answers=[
+                            {
+                                "question_id": q.id,
+                                "indices": [random.randrange(q.answer_count)],
+                            }
+                            for q in key.questions
+                        ],
+                    )
+                    for user_id in takers
+                ],
+            )
+            repository.create_solutions(session, owner, batch)
+    finally:
+        session.close()
+        engine.dispose()
+
+
+class Client:
+    """One simulated user, timing every request it makes by endpoint."""
+
+    def __init__(self, base_url: str, quiz_ids: List[str]):
+        self.base_url = base_url
+        self.http = requests.Session()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.failures: Dict[str, int] = defaultdict(int)
+        self.quiz_ids = quiz_ids
+        self.todo = random.sample(quiz_ids, len(quiz_ids))
+        self.questions: Dict[str, List[str]] = {}
+        self.credentials = {
+            "email": f"load-{uuid4()}@example.com",
+            "password": PASSWORD,
+        }
+        self.signup(self.credentials)
+        self.login()
+
+    def request(self, name: str, method: str, path: str, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        response = self.http.request(method, f"{self.base_url}{path}", **kwargs)
+        self.samples[name].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.failures[name] += 1
+        return response
+
+    def signup(self, credentials: Dict[str, str] = None) -> None:
+        credentials = credentials or {
+            "email": f"signup-{uuid4()}@example.com",
+            "password": PASSWORD,
+        }
+        self.request("signup", "POST", "/signup", json=credentials)
+
+    def login(self) -> None:
+        response = self.request("login", "POST", "/login", json=self.credentials)
+        token = response.json()["access_token"]
+        self.http.headers["Authorization"] = f"Bearer {token}"
+
+    def view(self, quiz_id: str = None) -> None:
+        quiz_id = quiz_id or random.choice(self.quiz_ids)
+        response = self.request("view", "GET", "/view/quiz", json={"id": quiz_id})
+        self.questions[quiz_id] = [q["id"] for q in response.json()["questions"]]
+
+    def submit(self) -> None:
+        if not self.todo:
+            return
+        quiz_id = self.todo.pop()
+        if quiz_id not in self.questions:
+            self.view(quiz_id)
+        data = {
+            "quiz_id": quiz_id,
+            "answers": [
+                {"question_id": q, "indices": [random.randrange(4)]}
+                for q in self.questions[quiz_id]
+            ],
+        }
+        self.request("submit", "POST", "/create/solution", json=data)
+
+    def list_todo(self) -> None:
+        self.request("list_todo", "GET", "/list/quiz/todo")
+
+    def list_mine(self) -> None:
+        self.request("list_mine", "GET", "/list/quiz/mine")
+
+    def list_submitted(self) -> None:
+        self.request("list_submitted", "GET", "/list/solution/submitted")
+
+    def run(self, deadline: float) -> None:
+        operations, weights = zip(*WEIGHTS.items())
+        while time.perf_counter() < deadline:
+            getattr(self, random.choices(operations, weights)[0])()
+        self.http.close()
+
+
+def published_quizzes(base_url: str) -> List[str]:
+    client = requests.Session()
+    credentials = {"email": "lister@example.com", "password": PASSWORD}
+    client.post(f"{base_url}/signup", json=credentials)
+    token = client.post(f"{base_url}/login", json=credentials).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    ids, params = [], {"limit": 500}
+    while True:
+        response = client.get(f"{base_url}/list/quiz/todo", params=params)
+        ids += [q["id"] for q in response.json()]
+        if "X-Next-Cursor" not in response.headers:
+            return ids
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+
+def run(base_url: str, clients: int, duration: float) -> Tuple[dict, float]:
+    quiz_ids = published_quizzes(base_url)
+    with ThreadPoolExecutor(clients) as pool:
+        users = list(pool.map(lambda _: Client(base_url, quiz_ids), range(clients)))
+        start = time.perf_counter()
+        list(pool.map(lambda c: c.run(start + duration), users))
+        elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for name in WEIGHTS:
+        samples = [s for c in users for s in c.samples[name]]
+        endpoints[name] = {
+            **summary(samples),
+            "failures": sum(c.failures[name] for c in users),
+            "requests_per_second": len(samples) / elapsed,
+        }
+    return endpoints, elapsed
+
+
+def compare(before: dict, after: dict) -> None:
+    print(f"{'endpoint':<16}{'req/s':>20}{'p50 ms':>22}{'p99 ms':>22}")
+    for name, new in after["endpoints"].items():
+        old = before["endpoints"].get(name)
+        if old is None:
+            continue
+        print(
+            f"{name:<16}"
+            f"{old['requests_per_second']:>9.1f} -> {new['requests_per_second']:<7.1f}"
+            f"{old['p50']:>11.1f} -> {new['p50']:<7.1f}"
+            f"{old['p99']:>11.1f} -> {new['p99']:<7.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--quizzes", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--solutions", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="defaults to load-<commit>.json")
+    parser.add_argument("--compare", help="earlier result to compare against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with database() as engine:
+        seed(str(engine.url), args.users, args.quizzes, args.questions, args.solutions)
+        # every client logs in from the same IP
+        with serve(engine, LOGIN_RATE_LIMIT="false") as base_url:
+            endpoints, elapsed = run(base_url, args.clients, args.duration)
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    ).stdout.strip()
+    result = {
+        "commit": commit,
+        "config": {
+            k: v for k, v in vars(args).items() if k not in ("output", "compare")
+        },
+        "seconds": elapsed,
+        "requests_per_second": sum(
+            e["requests_per_second"] for e in endpoints.values()
+        ),
+        "endpoints": endpoints,
+    }
+    with open(args.output or f"load-{commit or 'unknown'}.json", "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""p99 latency of ``/me`` while a storm of ``/login`` requests is running.
+
+Before bcrypt was moved off the event loop every login stalled all other
+requests; with the hashing service ``/me`` latency should barely move.
+
+The login rate limiter is off unless ``--rate-limit`` is passed, which turns
+the storm into failed attempts from a single IP, like credential stuffing.
+
+    python -m benchmarks.login_storm --storm-clients 32 --duration 10
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import requests
+
+from benchmarks.common import database, login, serve, summary
+
+
+def probe_me(base_url: str, headers, stop: threading.Event) -> List[float]:
+    samples = []
+    with requests.Session() as http:
+        while not stop.is_set():
+            start = time.perf_counter()
+            http.get(f"{base_url}/me", headers=headers).raise_for_status()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def storm(base_url: str, credentials, stop: threading.Event) -> List[int]:
+    statuses = []
+    with requests.Session() as http:
+        while not stop.is_set():
+            statuses.append(
+                http.post(f"{base_url}/login", json=credentials).status_code
+            )
+    return statuses
+
+
+def run(base_url: str, storm_clients: int, duration: float, wrong: bool) -> dict:
+    headers = login(base_url, "probe@example.com", "probe-password")
+    credentials = {"email": "storm@example.com", "password": "storm-password"}
+    login(base_url, **credentials)
+    if wrong:
+        credentials["password"] = "wrong-password"
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(storm_clients + 1) as pool:
+        probe = pool.submit(probe_me, base_url, headers, stop)
+        stormers = [
+            pool.submit(storm, base_url, credentials, stop)
+            for _ in range(storm_clients)
+        ]
+        time.sleep(duration)
+        stop.set()
+        statuses = [s for f in stormers for s in f.result()]
+
+    return {
+        "storm_clients": storm_clients,
+        "me_latency_ms": summary(probe.result()),
+        "logins_per_second": statuses.count(200) / duration,
+        "logins_shed": statuses.count(503),
+        "logins_throttled": statuses.count(429),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--storm-clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rate-limit", action="store_true")
+    args = parser.parse_args()
+
+    env = {} if args.rate_limit else {"LOGIN_RATE_LIMIT": "false"}
+    with database() as engine, serve(engine, **env) as base_url:
+        results = {
+            "idle": run(base_url, 0, args.duration, args.rate_limit),
+            "storm": run(base_url, args.storm_clients, args.duration, args.rate_limit),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
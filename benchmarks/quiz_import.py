@@ -0,0 +1,79 @@
+"""Import generated quizzes with the bulk importer and with create_quiz.
+
+Both write straight to the database through the repository, the HTTP layer is
+left out.
+
+    python -m benchmarks.quiz_import --quizzes 2000
+"""
+import argparse
+import json
+import random
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+import repository
+from benchmarks.common import database
+from db import create_db_engine
+from schemas import QuizCreate
+
+
+def make_quiz(i: int) -> QuizCreate:
+    questions = []
+    for j in range(random.randint(1, 10)):
+        answers = [
+            {"answer": f"Answer {k}", "correct": k == 0}
+            for k in range(random.randint(2, 5))
+        ]
+        questions.append(
+            {"question": f"Question {j}", "type": "single", "answers": answers}
+        )
+    return QuizCreate(name=f"Quiz {i}", questions=questions)
+
+
+def rows_of(quiz: QuizCreate) -> int:
+    answers = sum(len(q.answers) for q in quiz.questions)
+    return 1 + 2 * len(quiz.questions) + 2 * answers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quizzes", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    quizzes = [make_quiz(i) for i in range(args.quizzes)]
+    rows = sum(rows_of(q) for q in quizzes)
+
+    with database() as engine:
+        engine = create_db_engine(str(engine.url))
+        session = sessionmaker(bind=engine, autoflush=False)()
+        owner = repository.create_user(session, "owner@example.com", "").id
+
+        start = time.perf_counter()
+        for quiz in quizzes:
+            repository.create_quiz(session, owner, quiz)
+        one_by_one = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = repository.import_quizzes(session, owner, quizzes)
+        bulk = time.perf_counter() - start
+        session.close()
+        engine.dispose()
+
+    assert result.rows == rows
+    print(
+        json.dumps(
+            {
+                "quizzes": args.quizzes,
+                "rows": rows,
+                "create_quiz_rows_per_second": rows / one_by_one,
+                "import_rows_per_second": rows / bulk,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
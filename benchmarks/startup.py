@@ -0,0 +1,68 @@
+"""Cold start of a uvicorn worker: until it serves ``/`` and its first login.
+
+Every round starts a fresh server process and polls ``/`` until it answers,
+then signs up and logs in, which loads the database driver and bcrypt.
+
+    python -m benchmarks.startup --repeat 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+from benchmarks.common import database, free_port, summary
+
+
+def cold_start(url: str) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)]
+        + ["--log-level", "warning"],
+        env={**os.environ, "DATABASE_URL": url},
+    )
+    try:
+        while True:
+            try:
+                requests.get(base_url)
+                break
+            except requests.ConnectionError:
+                if server.poll() is not None:
+                    raise RuntimeError("server failed to start")
+                time.sleep(0.005)
+        first_request = time.perf_counter() - start
+        credentials = {"email": f"user-{port}@example.com", "password": "password"}
+        requests.post(f"{base_url}/signup", json=credentials).raise_for_status()
+        requests.post(f"{base_url}/login", json=credentials).raise_for_status()
+        return {
+            "first_request": first_request,
+            "first_login": time.perf_counter() - start,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with database() as engine:
+        rounds = [cold_start(str(engine.url)) for _ in range(args.repeat)]
+
+    print(
+        json.dumps(
+            {name: summary([r[name] for r in rounds]) for name in rounds[0]},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
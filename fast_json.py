@@ -0,0 +1,35 @@
+"""Fast JSON responses for the large read endpoints.
+
+With ``FAST_JSON_RESPONSES`` enabled, handlers serialize rows straight to bytes
+and return a ``FastJSONResponse``, skipping FastAPI's second validation against
+``response_model``. orjson is used when installed (``poetry install -E
+fast-json``), the standard json module otherwise.
+"""
+import json
+import os
+from typing import Any
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+FAST_JSON_RESPONSES = os.environ.get("FAST_JSON_RESPONSES", "false").lower() in (
+    "1",
+    "true",
+)
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=str, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
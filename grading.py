@@ -0,0 +1,108 @@
+import os
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from cache import LRUCache
+from models import Quiz
+from schemas import QuestionType, SolutionAnswer
+
+ANSWER_KEY_CACHE_SIZE = int(os.environ.get("ANSWER_KEY_CACHE_SIZE", 1000))
+
+
+class QuestionKey(NamedTuple):
+    id: UUID
+    single: bool
+    answer_count: int
+    # score of every possible selection, indexed by the bitmask of chosen answers
+    scores: Tuple[float, ...]
+
+
+def compile_question(question_id: UUID, type: str, correct: List[bool]) -> QuestionKey:
+    try:
+        c_weight = 1.0 / len([c for c in correct if c])
+    except ZeroDivisionError:
+        c_weight = 1.0
+
+    try:
+        w_weight = 1.0 / len([c for c in correct if not c])
+    except ZeroDivisionError:
+        w_weight = 1.0
+
+    scores = []
+    for mask in range(1 << len(correct)):
+        # accumulate in answer order so scores match answer-by-answer grading
+        score = 0.0
+        for j, is_correct in enumerate(correct):
+            if mask >> j & 1:
+                score += c_weight if is_correct else -w_weight
+        scores.append(score)
+
+    return QuestionKey(
+        id=question_id,
+        single=type == QuestionType.SINGLE.value,
+        answer_count=len(correct),
+        scores=tuple(scores),
+    )
+
+
+class AnswerKey:
+    """Everything needed to grade solutions of a quiz, without the database."""
+
+    def __init__(self, quiz_id: UUID, owner: UUID, questions: List[QuestionKey]):
+        self.quiz_id = quiz_id
+        self.owner = owner
+        self.questions = questions
+
+    def grade(self, answers: Iterable[SolutionAnswer]) -> List[float]:
+        return self.evaluate(answers)[0]
+
+    def evaluate(
+        self, answers: Iterable[SolutionAnswer]
+    ) -> Tuple[List[float], List[int]]:
+        """Scores of every question along with the bitmask of selected answers."""
+        indices_by_question: Dict[UUID, List[int]] = {}
+        for answer in answers:
+            indices_by_question.setdefault(answer.question_id, answer.indices)
+        if not indices_by_question.keys() <= {q.id for q in self.questions}:
+            raise HTTPException(
+                status_code=400, detail="Answers do not relate to selected quiz"
+            )
+
+        scores = [0.0] * len(self.questions)
+        selections = [0] * len(self.questions)
+        for i, question in enumerate(self.questions):
+            indices = indices_by_question.get(question.id)
+            if indices is None:
+                continue
+
+            if (question.single and len(indices) != 1) or (
+                not question.single and not 0 < len(indices) < question.answer_count
+            ):
+                raise HTTPException(
+                    status_code=400, detail="Question answered incorrectly"
+                )
+
+            mask = 0
+            for j in indices:
+                if 0 <= j < question.answer_count:
+                    mask |= 1 << j
+            scores[i] = question.scores[mask]
+            selections[i] = mask
+        return scores, selections
+
+
+def compile_answer_key(quiz: Quiz) -> AnswerKey:
+    return AnswerKey(
+        quiz.id,
+        quiz.owner,
+        [
+            compile_question(q.id, q.type, [a.correct for a in q.answers])
+            for q in quiz.questions
+        ],
+    )
+
+
+# published quizzes can't change, so their keys never need invalidating
+answer_keys = LRUCache(maxsize=ANSWER_KEY_CACHE_SIZE, ttl=float("inf"))
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastapi import HTTPException
+
+from utils import dummy_password_hash, get_hashed_password, verify_password
+
+HASHING_WORKERS = int(os.environ.get("HASHING_WORKERS", os.cpu_count() or 1))
+HASHING_QUEUE_LIMIT = int(os.environ.get("HASHING_QUEUE_LIMIT", 64))
+# verify logins of unknown emails against a dummy hash, so they take as long as
+# a wrong password and don't reveal which emails have an account
+LOGIN_DUMMY_VERIFY = os.environ.get("LOGIN_DUMMY_VERIFY", "true").lower() in (
+    "1",
+    "true",
+)
+
+
+class HashingService:
+    """Runs bcrypt on a bounded pool of worker threads instead of the event loop.
+
+    At most ``workers + queue_limit`` jobs are accepted at any time, anything
+    beyond that is rejected with a 503 so a burst of logins sheds load instead of
+    queueing unbounded CPU work.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="hashing"
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        try:
+            return self._executor.submit(self._run, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        try:
+            return fn(*args)
+        finally:
+            # free the slot before the result is published to the caller
+            self._slots.release()
+
+    async def hash_password(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(get_hashed_password, password))
+
+    async def verify_password(self, password: str, hashed_pass: str) -> bool:
+        return await asyncio.wrap_future(
+            self.submit(verify_password, password, hashed_pass)
+        )
+
+    async def verify_unknown_user(self, password: str) -> None:
+        if LOGIN_DUMMY_VERIFY:
+            await asyncio.wrap_future(
+                self.submit(lambda: verify_password(password, dummy_password_hash()))
+            )
+
+
+hasher = HashingService(workers=HASHING_WORKERS, queue_limit=HASHING_QUEUE_LIMIT)
@@ -0,0 +1,196 @@
+"""Per-request SQL and timing metrics.
+
+Engine events count every statement and its duration against the request that
+issued it, which is tracked in a context variable (``RequestSession`` copies
+the context into the database executor). ``RequestMetricsMiddleware`` adds
+the handler time and aggregates everything by route, rendered in the
+Prometheus text format by ``render_metrics``. Statements slower than
+``SLOW_QUERY_MS`` are logged together with their route.
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+REQUEST_METRICS = os.environ.get("REQUEST_METRICS", "true").lower() in ("1", "true")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))  # 0 = off
+
+logger = logging.getLogger(__name__)
+
+
+class RequestStats:
+    """What a single request spent, filled in as it runs."""
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # the router stores the matched endpoint in the scope
+        return route_path(self.scope.get("app"), self.scope.get("endpoint"))
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_routes: Dict[object, str] = {}
+
+
+def route_path(app: object, endpoint: object) -> str:
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _routes:
+        for route in getattr(app, "routes", []):
+            _routes.setdefault(getattr(route, "endpoint", None), route.path)
+    return _routes.get(endpoint, "unmatched")
+
+
+class RouteMetrics:
+    """Totals over all requests, keyed by method and route."""
+
+    FIELDS = (
+        "requests",
+        "queries",
+        "db_seconds",
+        "pool_wait_seconds",
+        "handler_seconds",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.routes: Dict[Tuple[str, str], Dict[str, float]] = {}
+            self.slow_queries = 0
+
+    def record(self, method: str, stats: RequestStats, handler_seconds: float) -> None:
+        with self._lock:
+            totals = self.routes.setdefault(
+                (method, stats.route), dict.fromkeys(self.FIELDS, 0)
+            )
+            totals["requests"] += 1
+            totals["queries"] += stats.queries
+            totals["db_seconds"] += stats.db_seconds
+            totals["pool_wait_seconds"] += stats.pool_wait_seconds
+            totals["handler_seconds"] += handler_seconds
+
+    def record_slow_query(self) -> None:
+        with self._lock:
+            self.slow_queries += 1
+
+
+route_metrics = RouteMetrics()
+
+_HELP = {
+    "requests": ("counter", "Requests handled"),
+    "queries": ("counter", "SQL statements executed"),
+    "db_seconds": ("counter", "Time spent executing SQL statements"),
+    "pool_wait_seconds": ("counter", "Time spent waiting for a pooled connection"),
+    "handler_seconds": ("counter", "Time until the response started"),
+}
+
+
+def render_metrics() -> str:
+    lines = []
+    with route_metrics._lock:
+        routes = sorted(route_metrics.routes.items())
+        slow_queries = route_metrics.slow_queries
+    for field in RouteMetrics.FIELDS:
+        name = f"quiz_{field}_total"
+        kind, description = _HELP[field]
+        lines.append(f"# HELP {name} {description}, by route.")
+        lines.append(f"# TYPE {name} {kind}")
+        for (method, route), totals in routes:
+            lines.append(f'{name}{{method="{method}",route="{route}"}} {totals[field]}')
+    lines.append(
+        "# HELP quiz_slow_queries_total SQL statements slower than SLOW_QUERY_MS."
+    )
+    lines.append("# TYPE quiz_slow_queries_total counter")
+    lines.append(f"quiz_slow_queries_total {slow_queries}")
+    return "\n".join(lines) + "\n"
+
+
+def record_pool_wait(seconds: float) -> None:
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, which is dropped even if the statement
+    # fails; the dialect's own statements on first connect come without one
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    elapsed = time.perf_counter() - context._query_start
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        route_metrics.record_slow_query()
+        logger.warning(
+            "slow query (%.1f ms) on %s: %s",
+            elapsed * 1000,
+            stats.route if stats is not None else "-",
+            statement,
+        )
+
+
+class RequestMetricsMiddleware:
+    """Tracks the statements and timings of every HTTP request by route."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        start = time.perf_counter()
+        handler_seconds = None
+
+        async def send_wrapper(message) -> None:
+            nonlocal handler_seconds
+            if message["type"] == "http.response.start":
+                handler_seconds = time.perf_counter() - start
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if handler_seconds is None:
+                handler_seconds = time.perf_counter() - start
+            route_metrics.record(scope["method"], stats, handler_seconds)
+            logger.debug(
+                "%s %s: %d queries, db %.1f ms, pool wait %.1f ms, handler %.1f ms",
+                scope["method"],
+                stats.route,
+                stats.queries,
+                stats.db_seconds * 1000,
+                stats.pool_wait_seconds * 1000,
+                handler_seconds * 1000,
+            )
+
+
+if REQUEST_METRICS or SLOW_QUERY_MS:
+    # every engine, including ones created after this import
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
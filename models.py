@@ -1,7 +1,7 @@
 import uuid
 
-from sqlalchemy import Boolean, ForeignKey, Text, UniqueConstraint
-from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy import Boolean, ForeignKey, Index, Integer, Text, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import ARRAY, DOUBLE_PRECISION, UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import Column
@@ -19,7 +19,10 @@ class User(Base):
 
 class QuizQuestions(Base):
     __tablename__ = "quiz_questions"
-    __table_args__ = (UniqueConstraint("quiz_id", "question_id"),)
+    __table_args__ = (
+        UniqueConstraint("quiz_id", "question_id"),
+        Index("ix_quiz_questions_question_id", "question_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     quiz_id = Column(ForeignKey("quiz.id"), nullable=False)
@@ -28,7 +31,10 @@ class QuizQuestions(Base):
 
 class QuestionAnswers(Base):
     __tablename__ = "question_answers"
-    __table_args__ = (UniqueConstraint("question_id", "answer_id"),)
+    __table_args__ = (
+        UniqueConstraint("question_id", "answer_id"),
+        Index("ix_question_answers_answer_id", "answer_id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     question_id = Column(ForeignKey("question.id"), nullable=False)
@@ -37,11 +43,23 @@ class QuestionAnswers(Base):
 
 class Quiz(Base):
     __tablename__ = "quiz"
+    __table_args__ = (
+        Index("ix_quiz_owner_name_id", "owner", "name", "id"),
+        Index("ix_quiz_owner_id", "owner", "id"),
+        Index(
+            "ix_quiz_published_name_id",
+            "name",
+            "id",
+            postgresql_where=text("published"),
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     owner = Column(UUID(as_uuid=True), ForeignKey("user.id"))
     name = Column(Text, nullable=False)
-    questions = relationship("Question", secondary="quiz_questions")
+    questions = relationship(
+        "Question", secondary="quiz_questions", order_by="Question.position"
+    )
     published = Column(Boolean, default=False)
 
 
@@ -51,7 +69,10 @@ class Question(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     question = Column(Text, nullable=False)
     type = Column(Text, nullable=False)
-    answers = relationship("Answer", secondary="question_answers")
+    position = Column(Integer, nullable=False, server_default="0")
+    answers = relationship(
+        "Answer", secondary="question_answers", order_by="Answer.position"
+    )
 
 
 class Answer(Base):
@@ -60,12 +81,46 @@ class Answer(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     answer = Column(Text, nullable=False)
     correct = Column(Boolean, nullable=False)
+    position = Column(Integer, nullable=False, server_default="0")
 
 
 class Solution(Base):
     __tablename__ = "solution"
+    __table_args__ = (
+        UniqueConstraint("user", "quiz", name="solution_user_quiz_key"),
+        Index("ix_solution_quiz_id", "quiz", "id"),
+        Index("ix_solution_user_id", "user", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user = Column(UUID(as_uuid=True), ForeignKey("user.id"))
     quiz = Column(UUID(as_uuid=True), ForeignKey("quiz.id"))
-    scores = Column(JSONB, nullable=False)
+    scores = Column(ARRAY(DOUBLE_PRECISION), nullable=False)
+    total_score = Column(DOUBLE_PRECISION, nullable=False)
+
+
+class QuizStats(Base):
+    __tablename__ = "quiz_stats"
+
+    quiz_id = Column(ForeignKey("quiz.id"), primary_key=True)
+    submissions = Column(Integer, nullable=False)
+    total_score_sum = Column(DOUBLE_PRECISION, nullable=False)
+    min_total_score = Column(DOUBLE_PRECISION, nullable=False)
+    max_total_score = Column(DOUBLE_PRECISION, nullable=False)
+
+
+class QuestionStats(Base):
+    __tablename__ = "question_stats"
+
+    quiz_id = Column(ForeignKey("quiz.id"), primary_key=True)
+    question_id = Column(ForeignKey("question.id"), primary_key=True)
+    score_sum = Column(DOUBLE_PRECISION, nullable=False)
+
+
+class AnswerStats(Base):
+    __tablename__ = "answer_stats"
+
+    quiz_id = Column(ForeignKey("quiz.id"), primary_key=True)
+    question_id = Column(ForeignKey("question.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    selections = Column(Integer, nullable=False)
@@ -0,0 +1,92 @@
+import base64
+import json
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.orm import Query as SQLQuery
+
+import fast_json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([str(v) for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+class Page:
+    """Keyset pagination parameters shared by the ``/list/*`` endpoints.
+
+    Results come back in a stable order, the cursor of the next page (if any) is
+    returned in the ``X-Next-Cursor`` response header.
+    """
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = Query(None, description="Cursor of the page to fetch"),
+        name: Optional[str] = Query(
+            None, description="Only include quizzes whose name starts with this"
+        ),
+    ):
+        self.limit = limit
+        self.after = decode_cursor(cursor) if cursor else None
+        self.name = name
+
+
+def cursor_values(page: Page, columns: Sequence) -> Optional[list]:
+    """The cursor of ``page`` as bind parameters typed like ``columns``."""
+    if page.after is None:
+        return None
+    if len(page.after) != len(columns):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return [
+        bindparam(None, value, type_=column.type)
+        for column, value in zip(columns, page.after)
+    ]
+
+
+def paginate(
+    query: SQLQuery, page: Page, columns: Sequence, key: Callable[[Any], Tuple]
+) -> Tuple[list, Optional[str]]:
+    """Fetch one page of ``query`` ordered by ``columns``.
+
+    ``key`` extracts the values of ``columns`` from a result row, they become the
+    cursor of the following page.
+    """
+    after = cursor_values(page, columns)
+    if after is not None:
+        query = query.filter(tuple_(*columns) > tuple_(*after))
+
+    rows = query.order_by(*columns).limit(page.limit + 1).all()
+    if len(rows) <= page.limit:
+        return rows, None
+    rows = rows[: page.limit]
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def paginated(
+    response: Response, result: Tuple[list, Optional[str]]
+) -> Union[list, Response]:
+    items, next_cursor = result
+    if fast_json.FAST_JSON_RESPONSES:
+        # items are built from typed columns, no need to validate them again
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+        return fast_json.FastJSONResponse([dict(i) for i in items], headers=headers)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
@@ -0,0 +1,198 @@
+"""On-demand cProfile profiles of single requests.
+
+Off unless ``PROFILE_ADMIN_TOKENS`` is set, in which case ``app`` installs
+``ProfilingMiddleware``. A request is profiled when it carries an allowlisted
+token in the ``X-Profile-Token`` header, or, with ``PROFILE_SAMPLE_RATE``, at
+random when its path is listed in ``PROFILE_ROUTES``. The last
+``PROFILE_KEEP`` profiles are kept in memory and downloaded as pstats files
+from ``/admin/profiles``.
+
+The event loop thread is profiled for the whole request, and calls on the
+database executor each in their own worker thread (see ``profiled``); their
+stats are merged into one profile. From Python 3.12 on, a profiler sees every
+thread by itself and no second one can run, so the event loop's covers both.
+Only one request is profiled at a time, as the event loop's profile would
+otherwise also cover the other one.
+"""
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, List, Optional, TypeVar
+from uuid import UUID, uuid4
+
+from fastapi import Header, HTTPException, status
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from schemas import ProfileOut
+
+T = TypeVar("T")
+
+PROFILE_ADMIN_TOKENS = [
+    t for t in os.environ.get("PROFILE_ADMIN_TOKENS", "").split(",") if t
+]
+PROFILE_ROUTES = [r for r in os.environ.get("PROFILE_ROUTES", "").split(",") if r]
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return token is not None and any(
+        hmac.compare_digest(token.encode(), allowed.encode())
+        for allowed in PROFILE_ADMIN_TOKENS
+    )
+
+
+def profile_admin(x_profile_token: str = Header(None)) -> None:
+    """Dependency admitting only requests with an allowlisted token."""
+    if not is_admin_token(x_profile_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed",
+        )
+
+
+class RequestProfile:
+    """The profilers of one request: the event loop's and the workers'."""
+
+    def __init__(self):
+        self.thread = threading.get_ident()
+        self.main = cProfile.Profile()
+        self.workers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_worker(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            self.workers.append(profiler)
+
+    def dump(self) -> bytes:
+        """The merged stats in the format of ``pstats.Stats.dump_stats``."""
+        with self._lock:
+            stats = pstats.Stats(self.main, *self.workers, stream=io.StringIO())
+        return marshal.dumps(stats.stats)
+
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "request_profile", default=None
+)
+
+
+def profiled(fn: Callable[[], T]) -> Callable[[], T]:
+    """Profile ``fn`` as part of the current request's profile, if any.
+
+    For work handed to another thread, which the request's profiler can't see.
+    """
+    profile = _active.get()
+    if profile is None or sys.version_info >= (3, 12):
+        return fn
+
+    def call() -> T:
+        if threading.get_ident() == profile.thread:
+            return fn()  # already covered by the event loop's profiler
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active, which must not fail the request
+            return fn()
+        try:
+            return fn()
+        finally:
+            profiler.disable()
+            profile.add_worker(profiler)
+
+    return call
+
+
+class ProfileStore:
+    """The last ``keep`` profiles, oldest first."""
+
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._profiles: "OrderedDict[UUID, ProfileOut]" = OrderedDict()
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def add(self, info: ProfileOut, data: bytes) -> None:
+        with self._lock:
+            self._profiles[info.id] = info
+            self._data[info.id] = data
+            while len(self._profiles) > self.keep:
+                old, _ = self._profiles.popitem(last=False)
+                del self._data[old]
+
+    def list(self) -> List[ProfileOut]:
+        with self._lock:
+            return list(self._profiles.values())
+
+    def get(self, profile_id: UUID) -> Optional[bytes]:
+        with self._lock:
+            return self._data.get(profile_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+            self._data.clear()
+
+
+profiles = ProfileStore(PROFILE_KEEP)
+
+
+class ProfilingMiddleware:
+    """Profiles requests asked for by an admin or sampled on listed routes."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._busy = threading.Lock()
+
+    def wanted(self, scope: Scope) -> bool:
+        if scope["path"].startswith("/admin/"):
+            return False  # downloading a profile shouldn't push another one out
+        for name, value in scope["headers"]:
+            if name == b"x-profile-token":
+                return is_admin_token(value.decode("latin-1"))
+        return scope["path"] in PROFILE_ROUTES and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        try:
+            profile.main.enable()
+        except ValueError:
+            # another profiler is active (Python 3.12+), serve it unprofiled
+            self._busy.release()
+            await self.app(scope, receive, send)
+            return
+
+        token = _active.set(profile)
+        started = datetime.utcnow()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.main.disable()
+            _active.reset(token)
+            self._busy.release()
+            info = ProfileOut(
+                id=uuid4(),
+                method=scope["method"],
+                path=scope["path"],
+                started=started,
+                seconds=time.perf_counter() - start,
+            )
+            profiles.add(info, profile.dump())
@@ -0,0 +1,82 @@
+"""Bulk quiz import, shared by ``/import/quiz`` and the command line.
+
+    python -m quiz_import question_bank.ndjson --owner john@gmail.com
+
+Documents are ``QuizCreate`` objects, either as a JSON array or one per line
+(NDJSON).
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+from fastapi import HTTPException
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError, parse_obj_as
+
+from schemas import QuizCreate
+
+
+def parse_quizzes(data: bytes, ndjson: bool = False) -> List[QuizCreate]:
+    try:
+        if ndjson:
+            documents = [json.loads(line) for line in data.splitlines() if line.strip()]
+        else:
+            documents = json.loads(data)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    try:
+        return parse_obj_as(List[QuizCreate], documents)
+    except ValidationError as e:
+        raise RequestValidationError(e.raw_errors)
+
+
+def main() -> None:
+    import repository
+    from db import new_session
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="JSON or NDJSON file, - for stdin")
+    parser.add_argument("--owner", required=True, help="email of the quizzes' owner")
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="one quiz per line (the default for .ndjson files)",
+    )
+    args = parser.parse_args()
+
+    if args.path == "-":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(args.path, "rb") as f:
+            data = f.read()
+
+    session = new_session()
+    try:
+        owner = repository.get_user_by_email(session, args.owner)
+        if owner is None:
+            sys.exit(f"No user with email {args.owner}")
+        try:
+            quizzes = parse_quizzes(data, args.ndjson or args.path.endswith(".ndjson"))
+            result = repository.import_quizzes(session, owner.id, quizzes)
+        except HTTPException as e:
+            sys.exit(e.detail)
+        except RequestValidationError as e:
+            sys.exit(str(e))
+    finally:
+        session.close()
+
+    print(
+        json.dumps(
+            {
+                "quizzes": len(result.ids),
+                "rows": result.rows,
+                "seconds": result.seconds,
+                "rows_per_second": result.rows / max(result.seconds, 1e-9),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Token buckets throttling ``/login`` by client IP and by email.
+
+Every attempt takes a token from the bucket of its IP and from the bucket of
+its email, and is rejected with a 429 before the user is looked up or any
+bcrypt work is queued when either is empty. A successful login gives the email
+token back, so only failed attempts count against an account.
+
+Buckets live in a ``BucketStore``. ``MemoryBucketStore`` keeps them per process
+and bounded in size; a store shared by all workers (e.g. on Redis) has to
+implement ``take`` atomically, and ``clear``.
+"""
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Tuple
+
+from fastapi import HTTPException
+
+LOGIN_RATE_LIMIT = os.environ.get("LOGIN_RATE_LIMIT", "true").lower() in ("1", "true")
+LOGIN_IP_PER_MINUTE = float(os.environ.get("LOGIN_IP_PER_MINUTE", 30))
+LOGIN_IP_BURST = float(os.environ.get("LOGIN_IP_BURST", 30))
+LOGIN_EMAIL_PER_MINUTE = float(os.environ.get("LOGIN_EMAIL_PER_MINUTE", 5))
+LOGIN_EMAIL_BURST = float(os.environ.get("LOGIN_EMAIL_BURST", 10))
+LOGIN_LIMITER_SIZE = int(os.environ.get("LOGIN_LIMITER_SIZE", 100000))
+
+
+class BucketStore(ABC):
+    """Where the levels of the token buckets are kept."""
+
+    @abstractmethod
+    def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        """Take ``cost`` tokens from the bucket ``key``.
+
+        Buckets start full with ``burst`` tokens and refill at ``rate`` tokens
+        per second. Returns 0 if the tokens were taken, otherwise the seconds
+        until they will be available. A negative ``cost`` gives tokens back.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Drop every bucket."""
+
+
+class MemoryBucketStore(BucketStore):
+    """Buckets of this process, at most ``maxsize`` of them.
+
+    The least recently used bucket is dropped first, so the size should cover
+    every key that can be active within ``burst / rate`` seconds; a dropped
+    bucket starts over full.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str, rate: float, burst: float, cost: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if cost > 0 and tokens < cost:
+                wait = (cost - tokens) / rate if rate > 0 else math.inf
+            else:
+                tokens, wait = min(burst, tokens - cost), 0.0
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class LoginLimiter:
+    def __init__(
+        self,
+        store: BucketStore,
+        ip_per_minute: float,
+        ip_burst: float,
+        email_per_minute: float,
+        email_burst: float,
+    ):
+        self.store = store
+        self.ip_rate = ip_per_minute / 60
+        self.ip_burst = ip_burst
+        self.email_rate = email_per_minute / 60
+        self.email_burst = email_burst
+
+    def check(self, ip: str, email: str) -> None:
+        """Count an attempt, raising a 429 if there were too many."""
+        wait = self.store.take(f"login:ip:{ip}", self.ip_rate, self.ip_burst, 1)
+        if not wait:
+            wait = self.store.take(
+                f"login:email:{email.lower()}", self.email_rate, self.email_burst, 1
+            )
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts, try again later",
+                headers={"Retry-After": str(min(math.ceil(wait), 86400))},
+            )
+
+    def succeeded(self, email: str) -> None:
+        self.store.take(
+            f"login:email:{email.lower()}", self.email_rate, self.email_burst, -1
+        )
+
+
+login_limiter = LoginLimiter(
+    MemoryBucketStore(LOGIN_LIMITER_SIZE),
+    ip_per_minute=LOGIN_IP_PER_MINUTE,
+    ip_burst=LOGIN_IP_BURST,
+    email_per_minute=LOGIN_EMAIL_PER_MINUTE,
+    email_burst=LOGIN_EMAIL_BURST,
+)
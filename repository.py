@@ -0,0 +1,706 @@
+"""Data access for the API handlers.
+
+Every function takes a SQLAlchemy session as its first argument and is meant
+to be awaited through ``db.RequestSession.run`` so the blocking database work
+stays off the event loop. Functions return pydantic schemas (or plain values), never
+ORM objects bound to the session.
+"""
+import csv
+import io
+import json
+import os
+import statistics
+import time
+from typing import Iterator, List, Optional, Set, Tuple
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException
+from sqlalchemy import func, true, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, selectinload
+
+import fast_json
+from cache import LRUCache
+from grading import AnswerKey, answer_keys, compile_answer_key
+from models import (
+    Answer,
+    AnswerStats,
+    Question,
+    QuestionAnswers,
+    QuestionStats,
+    Quiz,
+    QuizQuestions,
+    QuizStats,
+    Solution,
+    User,
+)
+from pagination import Page, cursor_values, paginate
+from schemas import (
+    ExportFormat,
+    QuestionStatsOut,
+    QuestionType,
+    QuizCreate,
+    QuizId,
+    QuizImportOut,
+    QuizOut,
+    QuizOutput,
+    QuizStatsOut,
+    SolutionCreate,
+    SolutionBatchCreate,
+    SolutionBatchItem,
+    SolutionOut,
+    SolutionResult,
+    SystemUser,
+    UserOut,
+)
+
+QUIZ_CACHE_SIZE = int(os.environ.get("QUIZ_CACHE_SIZE", 1000))
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 1000))
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 500))
+
+# serialized QuizOutput of published quizzes, which can no longer be edited
+quiz_cache = LRUCache(maxsize=QUIZ_CACHE_SIZE, ttl=float("inf"))
+
+
+def get_user_by_email(session: Session, email: str) -> Optional[SystemUser]:
+    user = session.query(User).filter_by(email=email).first()
+    if user is None:
+        return None
+    return SystemUser(id=user.id, email=user.email, password=user.password)
+
+
+def create_user(session: Session, email: str, hashed_password: str) -> UserOut:
+    user_id = uuid4()
+    session.add(User(id=user_id, email=email, password=hashed_password))
+    session.commit()
+    return UserOut(id=user_id, email=email)
+
+
+def check_correct_answers(quiz: QuizCreate) -> None:
+    for question in quiz.questions:
+        number_of_correct_answers = len([a for a in question.answers if a.correct])
+        if (
+            question.type == QuestionType.SINGLE and number_of_correct_answers != 1
+        ) or (question.type == QuestionType.MULTI and number_of_correct_answers < 1):
+            raise HTTPException(
+                status_code=400, detail="Incorrect number of correct answers"
+            )
+
+
+def create_quiz(session: Session, owner: UUID, quiz: QuizCreate) -> QuizOut:
+    check_correct_answers(quiz)
+    db_quiz = Quiz(id=uuid4(), name=quiz.name, owner=owner, published=False)
+    db_questions = []
+    for question in quiz.questions:
+        db_answers = []
+        for j, answer in enumerate(question.answers):
+            db_answers.append(
+                Answer(answer=answer.answer, correct=answer.correct, position=j)
+            )
+        db_questions.append(
+            Question(
+                question=question.question,
+                type=question.type.value,
+                position=len(db_questions),
+                answers=db_answers,
+            )
+        )
+    db_quiz.questions = db_questions
+    res = QuizOut(
+        id=db_quiz.id,
+        name=db_quiz.name,
+        published=db_quiz.published,
+    )
+    session.add(db_quiz)
+    session.commit()
+    return res
+
+
+def import_quizzes(
+    session: Session, owner: UUID, quizzes: List[QuizCreate]
+) -> QuizImportOut:
+    """Create many quizzes with one executemany per table and batch.
+
+    Every quiz is validated before anything is written. Quizzes are then
+    inserted ``IMPORT_BATCH_SIZE`` at a time, one transaction per batch.
+    """
+    for i, quiz in enumerate(quizzes):
+        try:
+            check_correct_answers(quiz)
+        except HTTPException as e:
+            raise HTTPException(
+                status_code=e.status_code, detail=f"Quiz {i}: {e.detail}"
+            )
+
+    start = time.perf_counter()
+    ids, rows = [], 0
+    for offset in range(0, len(quizzes), IMPORT_BATCH_SIZE):
+        tables = {
+            Quiz.__table__: [],
+            Question.__table__: [],
+            Answer.__table__: [],
+            QuizQuestions.__table__: [],
+            QuestionAnswers.__table__: [],
+        }
+        for quiz in quizzes[offset : offset + IMPORT_BATCH_SIZE]:
+            quiz_id = uuid4()
+            ids.append(quiz_id)
+            tables[Quiz.__table__].append(
+                {"id": quiz_id, "name": quiz.name, "owner": owner, "published": False}
+            )
+            for i, question in enumerate(quiz.questions):
+                question_id = uuid4()
+                tables[Question.__table__].append(
+                    {
+                        "id": question_id,
+                        "question": question.question,
+                        "type": question.type.value,
+                        "position": i,
+                    }
+                )
+                tables[QuizQuestions.__table__].append(
+                    {"id": uuid4(), "quiz_id": quiz_id, "question_id": question_id}
+                )
+                for j, answer in enumerate(question.answers):
+                    answer_id = uuid4()
+                    tables[Answer.__table__].append(
+                        {
+                            "id": answer_id,
+                            "answer": answer.answer,
+                            "correct": answer.correct,
+                            "position": j,
+                        }
+                    )
+                    tables[QuestionAnswers.__table__].append(
+                        {
+                            "id": uuid4(),
+                            "question_id": question_id,
+                            "answer_id": answer_id,
+                        }
+                    )
+
+        # parents first, so the foreign keys of the join tables resolve; the
+        # engine sends each executemany as multi-row INSERTs (execute_values)
+        for table, table_rows in tables.items():
+            session.execute(table.insert(), table_rows)
+            rows += len(table_rows)
+        session.commit()
+
+    return QuizImportOut(ids=ids, rows=rows, seconds=time.perf_counter() - start)
+
+
+def load_quiz_tree(session: Session, *criteria) -> Optional[Quiz]:
+    """Load a quiz with all its questions and answers.
+
+    Questions and answers are fetched with one query each, so this costs three
+    queries no matter how many questions the quiz has.
+    """
+    return (
+        session.query(Quiz)
+        .options(selectinload(Quiz.questions).selectinload(Question.answers))
+        .filter(*criteria)
+        .first()
+    )
+
+
+def get_quiz_json(session: Session, quiz_id: UUID) -> Optional[bytes]:
+    """Serialized ``QuizOutput`` of a quiz, published quizzes are cached.
+
+    Callers should look in ``quiz_cache`` first.
+    """
+    quiz = load_quiz_tree(session, Quiz.id == quiz_id)
+    if quiz is None:
+        return None
+    questions = [
+        {
+            "id": q.id,
+            "question": q.question,
+            "type": q.type,
+            "answers": [{"answer": a.answer} for a in q.answers],
+        }
+        for q in quiz.questions
+    ]
+    if fast_json.FAST_JSON_RESPONSES:
+        body = fast_json.dumps({"name": quiz.name, "questions": questions})
+    else:
+        body = QuizOutput(name=quiz.name, questions=questions).json().encode()
+    if quiz.published:
+        quiz_cache.set(quiz_id, body)
+    return body
+
+
+def _quiz_page(
+    session: Session, page: Page, *criteria
+) -> Tuple[List[QuizOut], Optional[str]]:
+    query = session.query(Quiz.id, Quiz.name, Quiz.published).filter(*criteria)
+    if page.name:
+        query = query.filter(Quiz.name.startswith(page.name, autoescape=True))
+    rows, next_cursor = paginate(
+        query, page, (Quiz.name, Quiz.id), key=lambda q: (q.name, q.id)
+    )
+    # rows are typed by their columns, FastAPI validates the response anyway
+    quizzes = [
+        QuizOut.construct(id=q.id, name=q.name, published=q.published) for q in rows
+    ]
+    return quizzes, next_cursor
+
+
+def list_my_quizzes(
+    session: Session, owner: UUID, page: Page, published: Optional[bool] = None
+) -> Tuple[List[QuizOut], Optional[str]]:
+    criteria = [Quiz.owner == owner]
+    if published is not None:
+        criteria.append(Quiz.published == published)
+    return _quiz_page(session, page, *criteria)
+
+
+def list_todo_quizzes(
+    session: Session, user_id: UUID, page: Page
+) -> Tuple[List[QuizOut], Optional[str]]:
+    return _quiz_page(session, page, Quiz.owner != user_id, Quiz.published == True)
+
+
+def _solution_out(s) -> SolutionOut:
+    return SolutionOut.construct(
+        quiz_id=s.quiz,
+        quiz_name=s.name,
+        completed_by=s.email,
+        scores=s.scores,
+        total_score=s.total_score,
+    )
+
+
+def list_submitted_solutions(
+    session: Session, user_id: UUID, page: Page
+) -> Tuple[List[SolutionOut], Optional[str]]:
+    # a range scan of ix_solution_user_id
+    query = (
+        session.query(
+            Solution.user,
+            Solution.id,
+            Solution.quiz,
+            Quiz.name,
+            User.email,
+            Solution.scores,
+            Solution.total_score,
+        )
+        .join(Quiz, Quiz.id == Solution.quiz)
+        .join(User, User.id == Solution.user)
+        .filter(Solution.user == user_id)
+    )
+    if page.name:
+        query = query.filter(Quiz.name.startswith(page.name, autoescape=True))
+    rows, next_cursor = paginate(
+        query, page, (Solution.user, Solution.id), key=lambda s: (s.user, s.id)
+    )
+    return [_solution_out(s) for s in rows], next_cursor
+
+
+def list_quiz_solutions(
+    session: Session, owner: UUID, page: Page
+) -> Tuple[List[SolutionOut], Optional[str]]:
+    # The owner's quizzes in id order (ix_quiz_owner_id), and for each a range
+    # scan of ix_solution_quiz_id from the cursor on. Both come out in page
+    # order, so the nested loop stops at the first quizzes that fill the page
+    # however many quizzes the owner has.
+    quizzes = session.query(Quiz.id, Quiz.name).filter(Quiz.owner == owner)
+    if page.name:
+        quizzes = quizzes.filter(Quiz.name.startswith(page.name, autoescape=True))
+    after = cursor_values(page, (Quiz.id, Solution.id))
+    if after is not None:
+        quizzes = quizzes.filter(Quiz.id >= after[0])
+    quizzes = quizzes.subquery()
+
+    solutions = (
+        session.query(Solution.id, User.email, Solution.scores, Solution.total_score)
+        .join(User, User.id == Solution.user)
+        .filter(Solution.quiz == quizzes.c.id)
+    )
+    if after is not None:
+        solutions = solutions.filter(
+            tuple_(Solution.quiz, Solution.id) > tuple_(*after)
+        )
+    solutions = (
+        solutions.order_by(Solution.id).limit(page.limit + 1).subquery().lateral()
+    )
+
+    query = session.query(
+        quizzes.c.id.label("quiz"),
+        solutions.c.id,
+        quizzes.c.name,
+        solutions.c.email,
+        solutions.c.scores,
+        solutions.c.total_score,
+    ).join(solutions, true())
+    rows, next_cursor = paginate(
+        query, page, (quizzes.c.id, solutions.c.id), key=lambda s: (s.quiz, s.id)
+    )
+    return [_solution_out(s) for s in rows], next_cursor
+
+
+def get_answer_key(session: Session, quiz_id: UUID) -> Optional[AnswerKey]:
+    """Answer key of a published quiz, compiled on first use and cached."""
+    key = answer_keys.get(quiz_id)
+    if key is None:
+        quiz = load_quiz_tree(session, Quiz.id == quiz_id, Quiz.published == True)
+        if quiz is None:
+            return None
+        key = compile_answer_key(quiz)
+        answer_keys.set(quiz_id, key)
+    return key
+
+
+def create_solution(
+    session: Session, user_id: UUID, solution: SolutionCreate
+) -> SolutionResult:
+    key = get_answer_key(session, solution.quiz_id)
+    if not key:
+        raise HTTPException(status_code=400, detail="No such quiz exists")
+    elif key.owner == user_id:
+        raise HTTPException(
+            status_code=400, detail="Quiz cannot be taken, it is your own"
+        )
+
+    scores, selections = key.evaluate(solution.answers)
+    res = SolutionResult(scores=scores, total_score=statistics.mean(scores))
+    if not _insert_solutions(session, [_solution_row(user_id, solution.quiz_id, res)]):
+        raise HTTPException(status_code=400, detail="Quiz has already been completed")
+    _record_stats(session, key, [(res, selections)])
+    session.commit()
+    return res
+
+
+def _solution_row(user_id: UUID, quiz_id: UUID, result: SolutionResult) -> dict:
+    return {
+        "id": uuid4(),
+        "user": user_id,
+        "quiz": quiz_id,
+        "scores": result.scores,
+        "total_score": result.total_score,
+    }
+
+
+def _insert_solutions(session: Session, rows: List[dict]) -> Set[UUID]:
+    """Insert solution rows, returning the users whose solution was stored.
+
+    The unique (user, quiz) constraint decides which of several concurrent
+    submissions wins, the others are skipped.
+    """
+    stmt = (
+        insert(Solution.__table__)
+        .values(rows)
+        .on_conflict_do_nothing(constraint="solution_user_quiz_key")
+        .returning(Solution.user)
+    )
+    return {u for u, in session.execute(stmt)}
+
+
+def create_solutions(
+    session: Session, owner: UUID, batch: SolutionBatchCreate
+) -> List[SolutionBatchItem]:
+    """Grade and store the solutions a quiz owner collected during an exam.
+
+    Items that can't be stored are reported with an error instead of failing the
+    whole batch.
+    """
+    key = get_answer_key(session, batch.quiz_id)
+    if not key or key.owner != owner:
+        raise HTTPException(status_code=400, detail="No such quiz exists")
+
+    user_ids = {s.user_id for s in batch.solutions}
+    known_users = {u for u, in session.query(User.id).filter(User.id.in_(user_ids))}
+    completed = {
+        u
+        for u, in session.query(Solution.user).filter(
+            Solution.quiz == batch.quiz_id, Solution.user.in_(user_ids)
+        )
+    }
+
+    results, rows, selections = [], [], {}
+    for solution in batch.solutions:
+        item = SolutionBatchItem(user_id=solution.user_id)
+        results.append(item)
+        if solution.user_id not in known_users:
+            item.error = "Could not find user"
+        elif solution.user_id == owner:
+            item.error = "Quiz cannot be taken, it is your own"
+        elif solution.user_id in completed:
+            item.error = "Quiz has already been completed"
+        else:
+            try:
+                scores, selections[solution.user_id] = key.evaluate(solution.answers)
+            except HTTPException as e:
+                item.error = e.detail
+                continue
+            completed.add(solution.user_id)
+            item.result = SolutionResult(
+                scores=scores, total_score=statistics.mean(scores)
+            )
+            rows.append(_solution_row(solution.user_id, batch.quiz_id, item.result))
+
+    if rows:
+        stored = _insert_solutions(session, rows)
+        graded = []
+        for item in results:
+            if item.result is None:
+                continue
+            if item.user_id in stored:
+                graded.append((item.result, selections[item.user_id]))
+            else:
+                # submitted concurrently through another request
+                item.result = None
+                item.error = "Quiz has already been completed"
+        if graded:
+            _record_stats(session, key, graded)
+        session.commit()
+    return results
+
+
+def _record_stats(
+    session: Session, key: AnswerKey, graded: List[Tuple[SolutionResult, List[int]]]
+) -> None:
+    """Add newly stored solutions to the running aggregates of their quiz.
+
+    ``graded`` pairs every result with the bitmasks of the selected answers.
+    Rows are always upserted in quiz order so concurrent submissions lock them
+    in the same order.
+    """
+    totals = [result.total_score for result, _ in graded]
+    table = QuizStats.__table__
+    stmt = insert(table).values(
+        quiz_id=key.quiz_id,
+        submissions=len(graded),
+        total_score_sum=sum(totals),
+        min_total_score=min(totals),
+        max_total_score=max(totals),
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.quiz_id],
+            set_={
+                "submissions": table.c.submissions + stmt.excluded.submissions,
+                "total_score_sum": table.c.total_score_sum
+                + stmt.excluded.total_score_sum,
+                "min_total_score": func.least(
+                    table.c.min_total_score, stmt.excluded.min_total_score
+                ),
+                "max_total_score": func.greatest(
+                    table.c.max_total_score, stmt.excluded.max_total_score
+                ),
+            },
+        )
+    )
+
+    table = QuestionStats.__table__
+    stmt = insert(table).values(
+        [
+            {
+                "quiz_id": key.quiz_id,
+                "question_id": question.id,
+                "score_sum": sum(result.scores[i] for result, _ in graded),
+            }
+            for i, question in enumerate(key.questions)
+        ]
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.quiz_id, table.c.question_id],
+            set_={"score_sum": table.c.score_sum + stmt.excluded.score_sum},
+        )
+    )
+
+    answer_rows = []
+    for i, question in enumerate(key.questions):
+        for j in range(question.answer_count):
+            count = sum(masks[i] >> j & 1 for _, masks in graded)
+            if count:
+                answer_rows.append(
+                    {
+                        "quiz_id": key.quiz_id,
+                        "question_id": question.id,
+                        "position": j,
+                        "selections": count,
+                    }
+                )
+    if answer_rows:
+        table = AnswerStats.__table__
+        stmt = insert(table).values(answer_rows)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.quiz_id, table.c.question_id, table.c.position],
+                set_={"selections": table.c.selections + stmt.excluded.selections},
+            )
+        )
+
+
+def get_owned_answer_key(session: Session, owner: UUID, quiz_id: UUID) -> AnswerKey:
+    key = get_answer_key(session, quiz_id)
+    if not key or key.owner != owner:
+        raise HTTPException(status_code=400, detail="No such quiz exists")
+    return key
+
+
+def get_quiz_stats(session: Session, owner: UUID, quiz_id: UUID) -> QuizStatsOut:
+    key = get_owned_answer_key(session, owner, quiz_id)
+
+    stats = session.query(QuizStats).get(quiz_id)
+    submissions = stats.submissions if stats else 0
+    score_sums = dict(
+        session.query(QuestionStats.question_id, QuestionStats.score_sum).filter(
+            QuestionStats.quiz_id == quiz_id
+        )
+    )
+    selections = {
+        (question_id, position): count
+        for question_id, position, count in session.query(
+            AnswerStats.question_id, AnswerStats.position, AnswerStats.selections
+        ).filter(AnswerStats.quiz_id == quiz_id)
+    }
+
+    return QuizStatsOut(
+        submissions=submissions,
+        mean_total_score=stats.total_score_sum / submissions if stats else None,
+        min_total_score=stats.min_total_score if stats else None,
+        max_total_score=stats.max_total_score if stats else None,
+        questions=[
+            QuestionStatsOut(
+                id=question.id,
+                mean_score=score_sums.get(question.id, 0.0) / submissions
+                if submissions
+                else None,
+                answer_selections=[
+                    selections.get((question.id, j), 0)
+                    for j in range(question.answer_count)
+                ],
+            )
+            for question in key.questions
+        ],
+    )
+
+
+def export_quiz_solutions(
+    session: Session, key: AnswerKey, format: ExportFormat
+) -> Iterator[bytes]:
+    """Encode every solution of a quiz, ``EXPORT_CHUNK_SIZE`` rows per chunk.
+
+    Rows are read through a server-side cursor, so memory use doesn't grow
+    with the number of solutions.
+    """
+    query = (
+        session.query(Solution.id, User.email, Solution.scores, Solution.total_score)
+        .join(User, User.id == Solution.user)
+        .filter(Solution.quiz == key.quiz_id)
+    )
+    result = session.execute(query.statement.execution_options(stream_results=True))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == ExportFormat.CSV:
+        writer.writerow(
+            ["id", "completed_by", "total_score"]
+            + [f"question_{i + 1}" for i in range(len(key.questions))]
+        )
+
+    while True:
+        rows = result.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            if format == ExportFormat.CSV:
+                writer.writerow([row.id, row.email, row.total_score, *row.scores])
+            else:
+                record = {
+                    "id": str(row.id),
+                    "completed_by": row.email,
+                    "scores": row.scores,
+                    "total_score": row.total_score,
+                }
+                buffer.write(json.dumps(record) + "\n")
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # a quiz without solutions still gets its CSV header
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _get_owned_draft(
+    session: Session, owner: UUID, quiz_id: UUID, load_tree: bool = False
+) -> Quiz:
+    criteria = (Quiz.owner == owner, Quiz.id == quiz_id)
+    if load_tree:
+        q = load_quiz_tree(session, *criteria)
+    else:
+        q = session.query(Quiz).filter(*criteria).first()
+    if not q:
+        raise HTTPException(status_code=400, detail="No such quiz exists")
+    if q.published:
+        raise HTTPException(status_code=400, detail="Quiz is already published")
+    return q
+
+
+def publish_quiz(session: Session, owner: UUID, quiz_id: UUID) -> QuizOut:
+    q = _get_owned_draft(session, owner, quiz_id, load_tree=True)
+    q.published = True
+    res = QuizOut(id=q.id, name=q.name, published=q.published)
+    key = compile_answer_key(q)
+    session.commit()
+    answer_keys.set(q.id, key)
+    quiz_cache.pop(q.id)
+    return res
+
+
+def delete_quiz(session: Session, owner: UUID, quiz_id: UUID) -> QuizId:
+    q = _get_owned_draft(session, owner, quiz_id)
+    res = QuizId(id=q.id)
+    session.delete(q)
+    session.commit()
+    quiz_cache.pop(q.id)
+    return res
+
+
+def _delete_question(session: Session, question: Question) -> None:
+    for answer in question.answers:
+        session.delete(answer)
+    session.delete(question)
+
+
+def edit_quiz(
+    session: Session, owner: UUID, quiz_id: UUID, new_quiz: QuizCreate
+) -> QuizOut:
+    """Update a draft in place, keeping its id.
+
+    Questions and answers are matched by position. Assigning an unchanged value
+    doesn't dirty an attribute, so only what actually differs is written.
+    """
+    check_correct_answers(new_quiz)
+    q = _get_owned_draft(session, owner, quiz_id, load_tree=True)
+    q.name = new_quiz.name
+
+    questions = list(q.questions)
+    for i, new_question in enumerate(new_quiz.questions):
+        if i == len(questions):
+            questions.append(Question(position=i, answers=[]))
+        question = questions[i]
+        question.question = new_question.question
+        question.type = new_question.type.value
+
+        answers = list(question.answers)
+        for j, new_answer in enumerate(new_question.answers):
+            if j == len(answers):
+                answers.append(Answer(position=j))
+            answers[j].answer = new_answer.answer
+            answers[j].correct = new_answer.correct
+        for answer in answers[len(new_question.answers) :]:
+            session.delete(answer)
+        question.answers = answers[: len(new_question.answers)]
+
+    for question in questions[len(new_quiz.questions) :]:
+        _delete_question(session, question)
+    q.questions = questions[: len(new_quiz.questions)]
+
+    res = QuizOut(id=q.id, name=q.name, published=q.published)
+    session.commit()
+    quiz_cache.pop(quiz_id)
+    return res
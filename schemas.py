@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 from uuid import UUID
@@ -13,6 +14,9 @@ class TokenSchema(BaseModel):
 class TokenPayload(BaseModel):
     sub: str = None
     exp: int = None
+    # user id and issue time, only checked with STATELESS_AUTH
+    uid: UUID = None
+    iat: float = None
 
 
 class UserAuth(BaseModel):
@@ -53,6 +57,11 @@ class QuestionType(Enum):
     MULTI = "multi"
 
 
+class ExportFormat(Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
 class QuestionSchema(BaseModel):
     question: str
     type: QuestionType
@@ -74,11 +83,41 @@ class SolutionCreate(BaseModel):
     answers: List[SolutionAnswer]
 
 
+class ProctoredSolution(BaseModel):
+    user_id: UUID
+    answers: List[SolutionAnswer]
+
+
+class SolutionBatchCreate(BaseModel):
+    quiz_id: UUID
+    solutions: conlist(ProctoredSolution, min_items=1, max_items=1000)
+
+
+class SolutionBatchItem(BaseModel):
+    user_id: UUID
+    result: Optional[SolutionResult]
+    error: Optional[str]
+
+
 class QuizCreate(BaseModel):
     name: str
     questions: conlist(QuestionSchema, min_items=1, max_items=10)
 
 
+class QuizImportOut(BaseModel):
+    ids: List[UUID]
+    rows: int
+    seconds: float
+
+
+class ProfileOut(BaseModel):
+    id: UUID
+    method: str
+    path: str
+    started: datetime
+    seconds: float
+
+
 class QuizEdit(BaseModel):
     id: UUID
     new_quiz: QuizCreate
@@ -87,6 +126,19 @@ class QuizEdit(BaseModel):
 class QuizId(BaseModel):
     id: UUID
 
+class QuestionStatsOut(BaseModel):
+    id: UUID
+    mean_score: Optional[float]
+    # number of submissions that selected each answer, in answer order
+    answer_selections: List[int]
+
+class QuizStatsOut(BaseModel):
+    submissions: int
+    mean_total_score: Optional[float]
+    min_total_score: Optional[float]
+    max_total_score: Optional[float]
+    questions: List[QuestionStatsOut]
+
 class AnswerOutput(BaseModel):
     answer: str
 
@@ -0,0 +1,30 @@
+"""``StreamingResponse`` for every supported Python version.
+
+starlette 0.13 streams the body and listens for the client disconnecting by
+handing both coroutines to ``asyncio.wait``, which Python 3.11 rejects; here
+they are wrapped in tasks first.
+"""
+import asyncio
+
+from fastapi import responses
+from starlette.types import Receive, Scope, Send
+
+
+class StreamingResponse(responses.StreamingResponse):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        tasks = [
+            asyncio.ensure_future(self.stream_response(send)),
+            asyncio.ensure_future(self.listen_for_disconnect(receive)),
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # the other one: the rest of the body once the client is gone, or
+            # waiting for a disconnect once it has been sent
+            for task in tasks:
+                task.cancel()
+        for task in done:
+            task.result()
+
+        if self.background is not None:
+            await self.background()
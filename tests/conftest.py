@@ -1,12 +1,16 @@
 import pytest
 import mock
 import testing.postgresql
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import close_all_sessions, sessionmaker
-import app
+import db
 import deps
+import grading
+import instrumentation
+import ratelimit
+import repository
 
 from typing import List
 
@@ -18,18 +22,23 @@ from sqlalchemy.engine import Engine
 
 
 def upgrade_head(engine: Engine) -> None:
-    revision = "head"
+    migrate(engine, "head")
+
+
+def migrate(engine: Engine, revision: str, downgrade: bool = False) -> None:
     alembic_config = AlembicConfig("alembic.ini")
     alembic_config.set_main_option("sqlalchemy.url", str(engine.url))
     script = ScriptDirectory.from_config(alembic_config)
 
-    def upgrade(rev, context) -> List[RevisionStep]:
+    def steps(rev, context) -> List[RevisionStep]:
+        if downgrade:
+            return script._downgrade_revs(revision, rev)
         return script._upgrade_revs(revision, rev)
 
     with EnvironmentContext(
         alembic_config,
         script,
-        fn=upgrade,
+        fn=steps,
         destination_rev=revision,
     ) as context:
         with engine.connect() as conn:
@@ -48,7 +57,7 @@ def db_url() -> str:
 
 @pytest.fixture
 def engine(db_url: str) -> Engine:
-    e = create_engine(db_url, pool_size=50, max_overflow=-1)
+    e = create_engine(db_url, pool_size=50, max_overflow=-1, executemany_mode="values")
 
     upgrade_head(e)
     yield e
@@ -59,15 +68,37 @@ def engine(db_url: str) -> Engine:
 
 @pytest.fixture(autouse=True)
 def patch_db(engine: Engine) -> None:
-    patch = mock.patch("app.Session", sessionmaker(bind=engine))
-    patch.__enter__()
-    patch = mock.patch("deps.Session", sessionmaker(bind=engine))
+    patch = mock.patch("db.Session", sessionmaker(bind=engine, autoflush=False))
     patch.__enter__()
 
 
+@pytest.fixture(autouse=True)
+def clear_caches() -> None:
+    # every test gets a fresh database, so nothing cached may leak between them
+    deps.principal_cache.clear()
+    deps.token_revocations.clear()
+    grading.answer_keys.clear()
+    repository.quiz_cache.clear()
+    instrumentation.route_metrics.reset()
+    ratelimit.login_limiter.store.clear()
+
+
 @pytest.fixture
 def session(engine: Engine) -> Session:
     s = Session(bind=engine)
     yield s
 
     s.close()
+
+
+@pytest.fixture
+def queries(engine: Engine) -> List[str]:
+    """Statements sent to the test database while the fixture is active."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
@@ -1,6 +1,44 @@
-from app import app
+import asyncio
+import copy
+import cProfile
+import csv
+import io
 import json
+import marshal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from uuid import UUID, uuid4
+
+import mock
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from pytest import approx
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session, sessionmaker
+
+import db
+import deps
+import fast_json
+import hashing
+import instrumentation
+import profiling
+import repository
+from app import app, hasher
+from db import create_db_engine, pool_metrics, pool_status
+from deps import principal_cache
+from hashing import HashingService
+from models import Answer, Solution, User
+from pagination import Page
+from ratelimit import login_limiter
+from repository import quiz_cache
+from schemas import SolutionCreate
+from tests.conftest import migrate
+from utils import create_access_token
 
 client = TestClient(app)
 
@@ -214,12 +252,12 @@ def test_full():
     edit_quiz_1 = {"id": old_quiz_1_id, "new_quiz": quiz_1}
     response = client.post("/edit/quiz", headers=john_headers, json=edit_quiz_1)
     quiz_1_id = response.json()['id']
-    # check that the quiz has been edited (id has been updated)
-    assert quiz_1_id != old_quiz_1_id
+    # check that the quiz has been edited in place (id is kept)
+    assert quiz_1_id == old_quiz_1_id
 
-    # check that the old quiz id has been deleted
-    response = client.get("/view/quiz", headers=john_headers, json={"id": old_quiz_1_id})
-    assert response.status_code == 404  # the id can no longer be found
+    # check that no other quiz has been created
+    response = client.get("/list/quiz/mine", headers=john_headers)
+    assert [q["id"] for q in response.json()] == [quiz_1_id]
 
     # jim attempts to view quiz 1 but cannot because it is not published
     response = client.get("/list/quiz/todo", headers=jim_headers)
@@ -266,3 +304,1049 @@ def test_full():
     # john can also see the same solution for the quiz since he posted it
     response = client.get("list/solution/quiz", headers=john_headers)
     assert solution == response.json()[0]
+
+
+def test_principal_cache(session):
+    client.post("/signup", json=john_credentials)
+    response = client.post("/login", json=john_credentials)
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    # the first request looks the user up, the following ones are served from the cache
+    for _ in range(3):
+        response = client.get("/me", headers=headers)
+        assert response.status_code == 200
+    assert principal_cache.misses == 1
+    assert principal_cache.hits == 2
+
+    # deleting the user drops the cached principal
+    session.delete(session.query(User).filter_by(email=john_credentials["email"]).one())
+    session.commit()
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 404
+
+
+def test_login_sheds_load_when_hashing_is_saturated():
+    client.post("/signup", json=john_credentials)
+
+    busy = HashingService(workers=1, queue_limit=0)
+    release = threading.Event()
+    blocker = busy.submit(release.wait)
+    with mock.patch("app.hasher", busy):
+        response = client.post("/login", json=john_credentials)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+        release.set()
+        blocker.result()
+        response = client.post("/login", json=john_credentials)
+        assert response.status_code == 200
+
+
+def test_hashing_does_not_hold_a_connection(engine, monkeypatch):
+    checked_out = []
+
+    def recording(method):
+        async def call(*args):
+            checked_out.append(pool_status(engine)["checked_out"])
+            return await method(*args)
+
+        return call
+
+    for name in ["hash_password", "verify_password", "verify_unknown_user"]:
+        monkeypatch.setattr(hasher, name, recording(getattr(hasher, name)))
+
+    assert client.post("/signup", json=john_credentials).status_code == 200
+    assert client.post("/login", json=john_credentials).status_code == 200
+    response = client.post("/login", json=jim_credentials)
+    assert response.status_code == 400
+    assert checked_out == [0, 0, 0]
+
+
+def test_more_clients_than_connections(db_url, monkeypatch):
+    headers = signup_and_login(john_credentials)
+    small = create_engine(db_url, pool_size=2, max_overflow=0, pool_timeout=5)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=small, autoflush=False))
+    monkeypatch.setattr(db, "db_executor", ThreadPoolExecutor(max_workers=2))
+    # every request looks the user up, then lists, in two calls
+    deps.principal_cache.clear()
+
+    async def get(path):
+        messages = []
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"authorization", headers["Authorization"].encode())],
+            "client": ("127.0.0.1", 1234),
+            "server": ("testserver", 80),
+            "scheme": "http",
+            "http_version": "1.1",
+        }
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+        return messages[0]["status"]
+
+    async def get_all():
+        return await asyncio.gather(*[get("/list/quiz/mine") for _ in range(8)])
+
+    start = time.perf_counter()
+    try:
+        assert asyncio.run(get_all()) == [200] * 8
+    finally:
+        db.db_executor.shutdown()
+        small.dispose()
+    assert time.perf_counter() - start < 5
+
+
+def test_pool_metrics(db_url):
+    engine = create_db_engine(db_url)
+    pool_metrics.reset()
+    with engine.connect() as connection:
+        connection.execute("SELECT 1")
+        with mock.patch("db._engine", engine):
+            response = client.get("/metrics/pool")
+    engine.dispose()
+
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["checked_out"] == 1
+    assert metrics["checkouts"] == 1
+    assert metrics["checkout_timeouts"] == 0
+
+
+def signup_and_login(credentials):
+    client.post("/signup", json=credentials)
+    response = client.post("/login", json=credentials)
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def create_published_quiz(headers, quiz):
+    quiz_id = client.post("/create/quiz", headers=headers, json=quiz).json()["id"]
+    client.put("/publish/quiz", headers=headers, json={"id": quiz_id})
+    return quiz_id
+
+
+def solve_quiz_2(headers, quiz_id):
+    question = client.get("/view/quiz", headers=headers, json={"id": quiz_id}).json()[
+        "questions"
+    ][0]
+    data = {"quiz_id": quiz_id, "answers": [{"question_id": question["id"], "indices": [0]}]}
+    response = client.post("/create/solution", headers=headers, json=data)
+    assert response.status_code == 200
+
+
+def test_list_solutions_query_count(queries):
+    john_headers = signup_and_login(john_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+
+    def count_queries(path, headers):
+        client.get("/me", headers=headers)  # make sure the principal is cached
+        queries.clear()
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        return len(queries), response.json()
+
+    students = [
+        signup_and_login({"email": f"student{i}@gmail.com", "password": "student"})
+        for i in range(3)
+    ]
+    solve_quiz_2(students[0], quiz_id)
+    single, solutions = count_queries("/list/solution/quiz", john_headers)
+    assert len(solutions) == 1
+
+    for headers in students[1:]:
+        solve_quiz_2(headers, quiz_id)
+    many, solutions = count_queries("/list/solution/quiz", john_headers)
+    assert len(solutions) == 3
+    assert many == single == 1
+
+    submitted, solutions = count_queries("/list/solution/submitted", students[0])
+    assert submitted == 1
+    assert solutions[0]["completed_by"] == "student0@gmail.com"
+    assert solutions[0]["quiz_name"] == "Quiz 2"
+
+
+def test_list_solutions_pagination():
+    john_headers = signup_and_login(john_credentials)
+    quiz_ids = [
+        create_published_quiz(john_headers, {**quiz_2, "name": f"Quiz {i}"})
+        for i in range(3)
+    ]
+    students = [
+        signup_and_login({"email": f"student{i}@gmail.com", "password": "student"})
+        for i in range(3)
+    ]
+    expected = set()
+    for i, headers in enumerate(students):
+        for quiz_id in quiz_ids[: i + 1]:
+            solve_quiz_2(headers, quiz_id)
+            expected.add((quiz_id, f"student{i}@gmail.com"))
+
+    def pages(path, headers, **params):
+        solutions, cursor = [], None
+        while True:
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(path, headers=headers, params={"limit": 2, **params})
+            assert response.status_code == 200
+            assert len(response.json()) <= 2
+            solutions += response.json()
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return solutions
+
+    solutions = pages("/list/solution/quiz", john_headers)
+    listed = [(s["quiz_id"], s["completed_by"]) for s in solutions]
+    assert sorted(listed) == sorted(expected)
+    assert [quiz_id for quiz_id, _ in listed] == sorted(q for q, _ in listed)
+
+    solutions = pages("/list/solution/quiz", john_headers, name="Quiz 2")
+    assert [s["completed_by"] for s in solutions] == ["student2@gmail.com"]
+
+    solutions = pages("/list/solution/submitted", students[2])
+    assert sorted(s["quiz_id"] for s in solutions) == sorted(quiz_ids)
+
+    response = client.get(
+        "/list/solution/quiz", headers=john_headers, params={"cursor": "nope"}
+    )
+    assert response.status_code == 400
+
+
+def test_quiz_solutions_page_stops_at_the_first_quizzes(engine, session):
+    owner = uuid4()
+    session.execute(
+        "INSERT INTO \"user\" (id, email, password) "
+        "SELECT gen_random_uuid(), 'student' || g, 'x' FROM generate_series(1, 3) g"
+    )
+    session.execute(
+        "INSERT INTO \"user\" (id, email, password) VALUES (:id, 'owner', 'x')",
+        {"id": str(owner)},
+    )
+    session.execute(
+        "INSERT INTO quiz (id, owner, name, published) "
+        "SELECT gen_random_uuid(), :id, 'Quiz ' || g, true "
+        "FROM generate_series(1, 500) g",
+        {"id": str(owner)},
+    )
+    session.execute(
+        "INSERT INTO solution (id, \"user\", quiz, scores, total_score) "
+        "SELECT gen_random_uuid(), u.id, q.id, '{1.0}', 1.0 "
+        "FROM quiz q CROSS JOIN \"user\" u WHERE u.email LIKE 'student%'"
+    )
+    session.commit()
+    session.execute("ANALYZE")
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        rows, cursor = repository.list_quiz_solutions(
+            session, owner, Page(limit=5, cursor=None, name=None)
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(rows) == 5 and cursor is not None
+
+    statement, parameters = statements[-1]
+    connection = engine.raw_connection()
+    try:
+        explain = connection.cursor()
+        explain.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters)
+        plan = explain.fetchone()[0][0]["Plan"]
+    finally:
+        connection.close()
+
+    def nodes(node):
+        yield node
+        for child in node.get("Plans", []):
+            yield from nodes(child)
+
+    # the quizzes holding the first 6 solutions and the next one, not all 500
+    [quiz_scan] = [n for n in nodes(plan) if n.get("Index Name") == "ix_quiz_owner_id"]
+    assert quiz_scan["Actual Rows"] <= 3
+
+
+def test_list_pagination():
+    headers = signup_and_login(john_credentials)
+    for name in ["Maths 2", "History", "Maths 1"]:
+        client.post("/create/quiz", headers=headers, json={**quiz_2, "name": name})
+
+    names, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/list/quiz/mine", headers=headers, params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        names += [q["name"] for q in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert names == ["History", "Maths 1", "Maths 2"]
+
+    response = client.get("/list/quiz/mine", headers=headers, params={"name": "Maths"})
+    assert [q["name"] for q in response.json()] == ["Maths 1", "Maths 2"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/list/quiz/mine", headers=headers, params={"published": True})
+    assert response.json() == []
+
+    response = client.get("/list/quiz/mine", headers=headers, params={"cursor": "nope"})
+    assert response.status_code == 400
+
+
+def test_create_solution_uses_compiled_answer_key(queries):
+    john_headers = signup_and_login(john_credentials)
+    jim_headers = signup_and_login(jim_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_1)
+    questions = client.get("/view/quiz", headers=jim_headers, json={"id": quiz_id}).json()[
+        "questions"
+    ]
+
+    queries.clear()
+    data = {
+        "quiz_id": quiz_id,
+        "answers": [
+            {"question_id": questions[0]["id"], "indices": [1]},
+            # out of range indices are ignored, like before
+            {"question_id": questions[1]["id"], "indices": [0, 3, 7]},
+        ],
+    }
+    response = client.post("/create/solution", headers=jim_headers, json=data)
+    assert response.status_code == 200
+    assert response.json()["scores"] == [1.0, 2 / 3]
+
+    # the key compiled at publish time is used, questions and answers aren't loaded
+    loaded = [q for q in queries if "question" in q or "answer" in q]
+    assert all(q.startswith("INSERT INTO") and "_stats" in q for q in loaded)
+
+
+def test_create_solution_batch():
+    john_headers = signup_and_login(john_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+    question_id = client.get(
+        "/view/quiz", headers=john_headers, json={"id": quiz_id}
+    ).json()["questions"][0]["id"]
+
+    def user_id(credentials):
+        return client.get("/me", headers=signup_and_login(credentials)).json()["id"]
+
+    jim = user_id(jim_credentials)
+    student = user_id({"email": "student@gmail.com", "password": "student"})
+    john = user_id(john_credentials)
+    unknown = str(uuid4())
+
+    def item(user, indices):
+        return {"user_id": user, "answers": [{"question_id": question_id, "indices": indices}]}
+
+    batch = {
+        "quiz_id": quiz_id,
+        "solutions": [
+            item(jim, [0]),
+            item(student, [0, 1]),
+            item(unknown, [0]),
+            item(john, [0]),
+            item(jim, [1]),
+            item(student, [1]),
+        ],
+    }
+    response = client.post("/create/solution/batch", headers=john_headers, json=batch)
+    assert response.status_code == 200
+    assert [(r["result"] or {}).get("scores") for r in response.json()] == [
+        [1.0], None, None, None, None, [-1.0]
+    ]
+    assert [r["error"] for r in response.json()] == [
+        None,
+        "Question answered incorrectly",
+        "Could not find user",
+        "Quiz cannot be taken, it is your own",
+        "Quiz has already been completed",
+        None,
+    ]
+    solutions = client.get("/list/solution/quiz", headers=john_headers).json()
+    assert sorted(s["completed_by"] for s in solutions) == ["jim@gmail.com", "student@gmail.com"]
+
+    # only the quiz owner can submit solutions for a quiz
+    jim_headers = signup_and_login(jim_credentials)
+    response = client.post("/create/solution/batch", headers=jim_headers, json=batch)
+    assert response.status_code == 400
+
+
+def test_owner_cannot_take_own_quiz():
+    john_headers = signup_and_login(john_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+    question = client.get("/view/quiz", headers=john_headers, json={"id": quiz_id}).json()[
+        "questions"
+    ][0]
+    data = {"quiz_id": quiz_id, "answers": [{"question_id": question["id"], "indices": [0]}]}
+    response = client.post("/create/solution", headers=john_headers, json=data)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Quiz cannot be taken, it is your own"
+
+    # nothing was stored or counted
+    assert client.get("/list/solution/quiz", headers=john_headers).json() == []
+    stats = client.get("/stats/quiz", headers=john_headers, json={"id": quiz_id}).json()
+    assert stats["submissions"] == 0
+
+
+def test_view_published_quiz_is_cached(queries):
+    john_headers = signup_and_login(john_credentials)
+    quiz_id = client.post("/create/quiz", headers=john_headers, json=quiz_2).json()["id"]
+
+    # drafts can still change, so they are not cached
+    client.get("/view/quiz", headers=john_headers, json={"id": quiz_id})
+    assert len(quiz_cache) == 0
+
+    client.put("/publish/quiz", headers=john_headers, json={"id": quiz_id})
+    first = client.get("/view/quiz", headers=john_headers, json={"id": quiz_id})
+    queries.clear()
+    second = client.get("/view/quiz", headers=john_headers, json={"id": quiz_id})
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.json()["name"] == "Quiz 2"
+    assert queries == []
+    assert quiz_cache.hits == 1
+
+
+def test_view_quiz_query_count(queries):
+    headers = signup_and_login(john_credentials)
+    quiz = {
+        "name": "Big quiz",
+        "questions": [
+            {
+                "question": f"Question {i}",
+                "type": "multi",
+                "answers": [{"answer": f"Answer {j}", "correct": j != 2} for j in range(5)],
+            }
+            for i in range(10)
+        ],
+    }
+    quiz_id = client.post("/create/quiz", headers=headers, json=quiz).json()["id"]
+
+    queries.clear()
+    response = client.get("/view/quiz", headers=headers, json={"id": quiz_id})
+    assert response.status_code == 200
+    # quiz, questions and answers are loaded with one query each
+    assert len(queries) == 3
+
+    questions = response.json()["questions"]
+    assert [q["question"] for q in questions] == [f"Question {i}" for i in range(10)]
+    for question in questions:
+        assert [a["answer"] for a in question["answers"]] == [f"Answer {j}" for j in range(5)]
+
+
+def test_lookups_use_indexes(session):
+    def plan(sql):
+        rows = session.execute("EXPLAIN " + sql, {"id": str(uuid4())})
+        return "\n".join(row[0] for row in rows)
+
+    # with tiny tables the planner would rather scan, make it show its options
+    session.execute("SET enable_seqscan = off")
+    session.execute("SET enable_bitmapscan = off")
+
+    assert "ix_quiz_owner_name_id" in plan(
+        "SELECT id, name FROM quiz WHERE owner = :id ORDER BY name, id LIMIT 51"
+    )
+    assert "ix_quiz_published_name_id" in plan(
+        "SELECT id, name FROM quiz WHERE owner != :id AND published = true "
+        "ORDER BY name, id LIMIT 51"
+    )
+    assert "solution_user_quiz_key" in plan(
+        'SELECT id FROM solution WHERE "user" = :id AND quiz = :id'
+    )
+    assert "ix_solution_quiz_id" in plan(
+        "SELECT id FROM solution WHERE quiz = :id ORDER BY id LIMIT 51"
+    )
+    assert "ix_solution_user_id" in plan(
+        'SELECT id FROM solution WHERE "user" = :id ORDER BY id LIMIT 51'
+    )
+    assert "ix_quiz_owner_id" in plan(
+        "SELECT id FROM quiz WHERE owner = :id ORDER BY id LIMIT 51"
+    )
+    assert "ix_quiz_questions_question_id" in plan(
+        "SELECT id FROM quiz_questions WHERE question_id = :id"
+    )
+    assert "ix_question_answers_answer_id" in plan(
+        "SELECT id FROM question_answers WHERE answer_id = :id"
+    )
+
+
+def test_concurrent_duplicate_submissions(engine, session):
+    john_headers = signup_and_login(john_credentials)
+    jim_headers = signup_and_login(jim_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+    jim_id = client.get("/me", headers=jim_headers).json()["id"]
+    question_id = client.get(
+        "/view/quiz", headers=jim_headers, json={"id": quiz_id}
+    ).json()["questions"][0]["id"]
+    solution = SolutionCreate(
+        quiz_id=quiz_id, answers=[{"question_id": question_id, "indices": [0]}]
+    )
+
+    attempts = 20
+    barrier = threading.Barrier(attempts)
+    make_session = sessionmaker(bind=engine)
+
+    def submit(_):
+        s = make_session()
+        try:
+            barrier.wait()
+            return repository.create_solution(s, jim_id, solution)
+        except HTTPException as e:
+            return e.detail
+        finally:
+            s.close()
+
+    with ThreadPoolExecutor(attempts) as pool:
+        outcomes = list(pool.map(submit, range(attempts)))
+
+    assert sum(not isinstance(o, str) for o in outcomes) == 1
+    assert outcomes.count("Quiz has already been completed") == attempts - 1
+    assert session.query(Solution).filter_by(quiz=quiz_id).count() == 1
+
+
+def test_quiz_stats(queries):
+    john_headers = signup_and_login(john_credentials)
+    jim_headers = signup_and_login(jim_credentials)
+    student_headers = signup_and_login({"email": "student@gmail.com", "password": "student"})
+    quiz_id = create_published_quiz(john_headers, quiz_1)
+    questions = client.get("/view/quiz", headers=jim_headers, json={"id": quiz_id}).json()[
+        "questions"
+    ]
+
+    response = client.get("/stats/quiz", headers=john_headers, json={"id": quiz_id})
+    assert response.status_code == 200
+    assert response.json()["submissions"] == 0
+    assert response.json()["mean_total_score"] is None
+    assert response.json()["questions"][1]["answer_selections"] == [0] * 5
+
+    for headers, indices in [(jim_headers, ([1], [0, 3, 7])), (student_headers, ([0], [0, 2]))]:
+        data = {
+            "quiz_id": quiz_id,
+            "answers": [
+                {"question_id": q["id"], "indices": i} for q, i in zip(questions, indices)
+            ],
+        }
+        assert client.post("/create/solution", headers=headers, json=data).status_code == 200
+
+    queries.clear()
+    stats = client.get("/stats/quiz", headers=john_headers, json={"id": quiz_id}).json()
+    # read from the aggregates, solutions aren't scanned
+    assert not [q for q in queries if "FROM solution" in q]
+    assert stats["submissions"] == 2
+    assert stats["mean_total_score"] == approx(0.125)
+    assert stats["min_total_score"] == approx(-7 / 12)
+    assert stats["max_total_score"] == approx(5 / 6)
+    assert [q["id"] for q in stats["questions"]] == [q["id"] for q in questions]
+    assert [q["mean_score"] for q in stats["questions"]] == approx([0.0, 0.25])
+    assert [q["answer_selections"] for q in stats["questions"]] == [[1, 1], [2, 0, 1, 1, 0]]
+
+    # only the owner sees the statistics of a quiz
+    response = client.get("/stats/quiz", headers=jim_headers, json={"id": quiz_id})
+    assert response.status_code == 400
+
+
+def test_export_quiz_solutions(engine, monkeypatch):
+    monkeypatch.setattr(repository, "EXPORT_CHUNK_SIZE", 2)
+    john_headers = signup_and_login(john_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+
+    response = client.get(
+        "/export/solution/quiz", headers=john_headers, params={"quiz_id": quiz_id}
+    )
+    assert response.status_code == 200
+    assert response.text.splitlines() == ["id,completed_by,total_score,question_1"]
+
+    for i in range(5):
+        solve_quiz_2(signup_and_login({"email": f"student{i}@gmail.com", "password": "student"}), quiz_id)
+
+    response = client.get(
+        "/export/solution/quiz", headers=john_headers, params={"quiz_id": quiz_id}
+    )
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert sorted(r["completed_by"] for r in rows) == [f"student{i}@gmail.com" for i in range(5)]
+    assert {(r["total_score"], r["question_1"]) for r in rows} == {("1.0", "1.0")}
+
+    response = client.get(
+        "/export/solution/quiz",
+        headers=john_headers,
+        params={"quiz_id": quiz_id, "format": "ndjson"},
+    )
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == 5
+    assert records[0]["scores"] == [1.0]
+    assert {r["id"] for r in records} == {r["id"] for r in rows}
+    # the streaming session has been closed
+    assert pool_status(engine)["checked_out"] == 0
+
+    jim_headers = signup_and_login(jim_credentials)
+    response = client.get(
+        "/export/solution/quiz", headers=jim_headers, params={"quiz_id": quiz_id}
+    )
+    assert response.status_code == 400
+
+
+def test_import_quizzes(queries, monkeypatch):
+    monkeypatch.setattr(repository, "IMPORT_BATCH_SIZE", 2)
+    headers = signup_and_login(john_credentials)
+    quizzes = [quiz_1, quiz_2, {**quiz_1, "name": "Quiz 3"}]
+
+    queries.clear()
+    response = client.post(
+        "/import/quiz",
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+        data="\n".join(json.dumps(q) for q in quizzes),
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert len(result["ids"]) == 3
+    # quizzes, questions, answers and both join tables
+    assert result["rows"] == 3 + 5 + 16 + 5 + 16
+    # one insert per table and batch, whatever the number of quizzes
+    assert len([q for q in queries if q.startswith("INSERT")]) == 2 * 5
+
+    names = [q["name"] for q in client.get("/list/quiz/mine", headers=headers).json()]
+    assert names == ["Quiz 1", "Quiz 2", "Quiz 3"]
+    client.put("/publish/quiz", headers=headers, json={"id": result["ids"][0]})
+    quiz = client.get("/view/quiz", headers=headers, json={"id": result["ids"][0]}).json()
+    assert [q["question"] for q in quiz["questions"]] == [q["question"] for q in quiz_1["questions"]]
+    assert [a["answer"] for a in quiz["questions"][1]["answers"]] == [
+        a["answer"] for a in quiz_1["questions"][1]["answers"]
+    ]
+
+    # one invalid quiz rejects the whole import
+    response = client.post("/import/quiz", headers=headers, json=[quiz_2, quiz_2_no_answers])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Quiz 1: Incorrect number of correct answers"
+    response = client.post("/import/quiz", headers=headers, json=[{"name": "Quiz 4"}])
+    assert response.status_code == 422
+    assert len(client.get("/list/quiz/mine", headers=headers).json()) == 3
+
+
+def test_edit_quiz_in_place(queries, session):
+    headers = signup_and_login(john_credentials)
+    quiz_id = client.post("/create/quiz", headers=headers, json=quiz_1).json()["id"]
+
+    def edit(new_quiz):
+        queries.clear()
+        response = client.post(
+            "/edit/quiz", headers=headers, json={"id": quiz_id, "new_quiz": new_quiz}
+        )
+        assert response.status_code == 200
+        assert response.json()["id"] == quiz_id
+        return [q for q in queries if q.split()[0] in ("INSERT", "UPDATE", "DELETE")]
+
+    edited = copy.deepcopy(quiz_1)
+    edited["questions"][1]["answers"][2]["answer"] = "kilogram"
+    writes = edit(edited)
+    assert len(writes) == 1
+    assert writes[0].startswith("UPDATE answer")
+
+    # nothing changed, nothing written
+    assert edit(edited) == []
+
+    edited["name"] = "Quiz 1b"
+    edited["questions"][1]["answers"] = edited["questions"][1]["answers"][:3]
+    edited["questions"].append(quiz_2["questions"][0])
+    edit(edited)
+    # removed answers are deleted, not just unlinked
+    assert session.query(Answer).count() == 2 + 3 + 2
+
+    # a rejected edit leaves the quiz untouched
+    response = client.post(
+        "/edit/quiz", headers=headers, json={"id": quiz_id, "new_quiz": quiz_2_no_answers}
+    )
+    assert response.json()["detail"] == "Incorrect number of correct answers"
+
+    client.put("/publish/quiz", headers=headers, json={"id": quiz_id})
+    quiz = client.get("/view/quiz", headers=headers, json={"id": quiz_id}).json()
+    assert quiz["name"] == "Quiz 1b"
+    assert [[a["answer"] for a in q["answers"]] for q in quiz["questions"]] == [
+        ["yes", "no"],
+        ["kelvin", "farenheit", "kilogram"],
+        ["yes", "no"],
+    ]
+
+
+def test_error_paths_return_connections(engine, monkeypatch):
+    # the failed logins below shouldn't be throttled
+    monkeypatch.setattr(login_limiter, "email_burst", 100)
+
+    john_headers = signup_and_login(john_credentials)
+    jim_headers = signup_and_login(jim_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+    solve_quiz_2(jim_headers, quiz_id)
+    unknown = {"id": str(uuid4())}
+
+    for _ in range(20):
+        # each of these fails after the request's session has been used
+        assert client.post("/signup", json=john_credentials).status_code == 400
+        wrong_password = {**john_credentials, "password": "wrong"}
+        assert client.post("/login", json=wrong_password).status_code == 400
+        for quiz in [unknown, {"id": quiz_id}]:
+            response = client.put("/publish/quiz", headers=john_headers, json=quiz)
+            assert response.status_code == 400
+        response = client.post("/delete/quiz", headers=john_headers, json=unknown)
+        assert response.status_code == 400
+        response = client.get("/stats/quiz", headers=jim_headers, json={"id": quiz_id})
+        assert response.status_code == 400
+        data = {"quiz_id": quiz_id, "answers": []}
+        response = client.post("/create/solution", headers=jim_headers, json=data)
+        assert response.json()["detail"] == "Quiz has already been completed"
+        assert pool_status(engine)["checked_out"] == 0
+
+    # the token of a deleted user fails inside get_current_user
+    student = {"email": "student@gmail.com", "password": "student"}
+    student_headers = signup_and_login(student)
+    s = Session(bind=engine)
+    s.query(User).filter_by(email=student["email"]).delete()
+    s.commit()
+    s.close()
+    principal_cache.clear()
+    assert client.get("/me", headers=student_headers).status_code == 404
+    assert pool_status(engine)["checked_out"] == 0
+
+
+def test_fast_json_responses(monkeypatch):
+    john_headers = signup_and_login(john_credentials)
+    jim_headers = signup_and_login(jim_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_1)
+    create_published_quiz(john_headers, quiz_2)
+    questions = client.get("/view/quiz", headers=jim_headers, json={"id": quiz_id}).json()[
+        "questions"
+    ]
+    data = {
+        "quiz_id": quiz_id,
+        "answers": [
+            {"question_id": questions[0]["id"], "indices": [1]},
+            {"question_id": questions[1]["id"], "indices": [0, 1, 2]},
+        ],
+    }
+    client.post("/create/solution", headers=jim_headers, json=data)
+
+    def responses():
+        quiz_cache.clear()
+        return [
+            client.get(path, headers=headers, params=params)
+            for path, headers, params in [
+                ("/list/quiz/todo", jim_headers, {"limit": 1}),
+                ("/list/quiz/mine", john_headers, {}),
+                ("/list/solution/quiz", john_headers, {}),
+                ("/list/solution/submitted", jim_headers, {}),
+            ]
+        ] + [client.get("/view/quiz", headers=jim_headers, json={"id": quiz_id})]
+
+    expected = responses()
+    monkeypatch.setattr(fast_json, "FAST_JSON_RESPONSES", True)
+    for response, fast in zip(expected, responses()):
+        assert fast.status_code == 200
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.json() == response.json()
+        assert fast.headers.get("X-Next-Cursor") == response.headers.get("X-Next-Cursor")
+    assert expected[0].headers["X-Next-Cursor"]
+
+
+def test_stateless_auth(queries, session, monkeypatch):
+    monkeypatch.setattr(deps, "STATELESS_AUTH", True)
+    headers = signup_and_login(john_credentials)
+    me = client.get("/me", headers=headers).json()
+    assert me["email"] == john_credentials["email"]
+    assert "password" not in me
+
+    queries.clear()
+    assert client.get("/list/quiz/mine", headers=headers).status_code == 200
+    # only the listing itself, the user isn't looked up
+    assert len(queries) == 1
+    assert len(deps.principal_cache) == 0
+
+    # changing the user revokes the tokens issued so far
+    user = session.query(User).filter_by(email=john_credentials["email"]).one()
+    user.email = "johnny@gmail.com"
+    session.commit()
+    response = client.get("/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Token revoked"
+
+    headers = signup_and_login({**john_credentials, "email": "johnny@gmail.com"})
+    assert client.get("/me", headers=headers).json()["id"] == me["id"]
+
+    # a revocation this process saw but another didn't: the other process still
+    # issues tokens that are valid here
+    deps.token_revocations.revoke(UUID(me["id"]))
+    with mock.patch.object(deps, "token_revocations", deps.TokenRevocations(60)):
+        issued_elsewhere = signup_and_login(
+            {**john_credentials, "email": "johnny@gmail.com"}
+        )
+    assert client.get("/me", headers=headers).status_code == 401
+    assert client.get("/me", headers=issued_elsewhere).json()["id"] == me["id"]
+
+    # tokens without the claims are still checked against the database
+    old_token = create_access_token("johnny@gmail.com")
+    queries.clear()
+    response = client.get("/me", headers={"Authorization": f"Bearer {old_token}"})
+    assert response.json()["id"] == me["id"]
+    assert len(queries) == 1
+
+
+def test_request_metrics(engine, queries, monkeypatch, caplog):
+    john_headers = signup_and_login(john_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_1)
+    instrumentation.route_metrics.reset()
+
+    queries.clear()
+    for _ in range(2):
+        client.get("/view/quiz", headers=john_headers, json={"id": quiz_id})
+    view_queries = len(queries)
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain")
+    lines = metrics.text.splitlines()
+    assert 'quiz_requests_total{method="GET",route="/view/quiz"} 2' in lines
+    assert f'quiz_queries_total{{method="GET",route="/view/quiz"}} {view_queries}' in lines
+    assert "quiz_slow_queries_total 0" in lines
+    for field in ("db_seconds", "pool_wait_seconds", "handler_seconds"):
+        assert any(
+            line.startswith(f'quiz_{field}_total{{method="GET",route="/view/quiz"}}')
+            for line in lines
+        )
+
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 1e-6)
+    with caplog.at_level("WARNING", logger="instrumentation"):
+        client.get("/list/quiz/mine", headers=john_headers)
+    assert any("on /list/quiz/mine: SELECT" in r.getMessage() for r in caplog.records)
+    assert "quiz_slow_queries_total 0" not in client.get("/metrics").text.splitlines()
+
+    # failing statements leave nothing behind on the pooled connection
+
+    with engine.connect() as connection:
+        for _ in range(3):
+            try:
+                connection.execute("SELECT * FROM no_such_table")
+            except ProgrammingError:
+                pass
+        assert connection.execute("SELECT 1").scalar() == 1
+        assert "query_start" not in connection.info
+
+
+def test_profiling(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ADMIN_TOKENS", ["secret"])
+    profiling.profiles.clear()
+    profiled_client = TestClient(profiling.ProfilingMiddleware(app))
+
+    john_headers = signup_and_login(john_credentials)
+    jim_headers = signup_and_login(jim_credentials)
+    quiz_id = create_published_quiz(john_headers, quiz_2)
+    question = client.get("/view/quiz", headers=jim_headers, json={"id": quiz_id}).json()[
+        "questions"
+    ][0]
+    data = {"quiz_id": quiz_id, "answers": [{"question_id": question["id"], "indices": [0]}]}
+
+    # only requests with an allowlisted token are profiled
+    profiled_client.get("/list/quiz/todo", headers={**jim_headers, "X-Profile-Token": "wrong"})
+    profiled_client.get("/list/quiz/todo", headers=jim_headers)
+    assert profiled_client.get("/admin/profiles").status_code == 403
+    assert profiled_client.get("/admin/profiles", headers={"X-Profile-Token": "wrong"}).status_code == 403
+    admin = {"X-Profile-Token": "secret"}
+    assert profiled_client.get("/admin/profiles", headers=admin).json() == []
+
+    response = profiled_client.post("/create/solution", headers={**jim_headers, **admin}, json=data)
+    assert response.status_code == 200
+    [info] = profiled_client.get("/admin/profiles", headers=admin).json()
+    assert info["method"] == "POST"
+    assert info["path"] == "/create/solution"
+
+    response = profiled_client.get("/admin/profile", headers=admin, params={"id": info["id"]})
+    assert response.headers["content-type"] == "application/octet-stream"
+    stats = marshal.loads(response.content)
+    # the database work done on the executor is part of the profile
+    assert any(
+        filename.endswith("repository.py") and name == "create_solution"
+        for filename, _, name in stats
+    )
+    missing = profiled_client.get("/admin/profile", headers=admin, params={"id": quiz_id})
+    assert missing.status_code == 404
+
+    # sampled routes
+    monkeypatch.setattr(profiling, "PROFILE_ROUTES", ["/list/quiz/todo"])
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    profiled_client.get("/list/quiz/todo", headers=jim_headers)
+    profiled_client.get("/list/quiz/mine", headers=john_headers)
+    paths = [p["path"] for p in profiled_client.get("/admin/profiles", headers=admin).json()]
+    assert paths == ["/create/solution", "/list/quiz/todo"]
+
+    monkeypatch.setattr(profiling.profiles, "keep", 1)
+    profiled_client.get("/list/quiz/todo", headers=jim_headers)
+    assert len(profiled_client.get("/admin/profiles", headers=admin).json()) == 1
+
+    # profilers that can't be started (Python 3.12+ allows only one) don't
+    # break the request, it just isn't profiled
+
+    class Busy(cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+
+    profiling.profiles.clear()
+    monkeypatch.setattr(profiling, "cProfile", SimpleNamespace(Profile=Busy))
+    response = profiled_client.get("/list/quiz/todo", headers={**jim_headers, **admin})
+    assert response.status_code == 200
+    assert profiled_client.get("/admin/profiles", headers=admin).json() == []
+
+    # nor do the workers' alone
+    request_profile = profiling.RequestProfile()
+    request_profile.thread = None  # as if called on another thread
+    token = profiling._active.set(request_profile)
+    try:
+        assert profiling.profiled(lambda: 42)() == 42
+    finally:
+        profiling._active.reset(token)
+    assert request_profile.workers == []
+
+
+STARTUP_BUDGET = 1.5  # seconds from a cold import to the first served request
+
+STARTUP_SCRIPT = """
+import asyncio
+import json
+import sys
+import time
+
+start = time.perf_counter()
+from app import app
+
+messages = []
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    messages.append(message)
+
+
+scope = {
+    "type": "http",
+    "method": "GET",
+    "path": "/",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [],
+    "server": ("testserver", 80),
+    "client": ("testclient", 50000),
+    "scheme": "http",
+}
+asyncio.run(app(scope, receive, send))
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "status": messages[0]["status"],
+    "loaded": [m for m in ("graphene", "passlib", "psycopg2") if m in sys.modules],
+}))
+"""
+
+
+def test_startup_budget():
+    # a fresh interpreter, nothing imported yet
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT], capture_output=True, check=True
+    ).stdout
+    result = json.loads(output)
+    assert result["status"] == 200
+    # the database driver and bcrypt are loaded by the first request using them
+    assert result["loaded"] == []
+    assert result["seconds"] < STARTUP_BUDGET
+
+
+def test_login_rate_limit(queries, monkeypatch):
+    verified = []
+
+    def verify_password(password, hashed_pass):
+        verified.append(password)
+        return real_verify_password(password, hashed_pass)
+
+    real_verify_password = hashing.verify_password
+    monkeypatch.setattr(hashing, "verify_password", verify_password)
+    monkeypatch.setattr(login_limiter, "email_burst", 3)
+    signup_and_login(john_credentials)
+    signup_and_login(jim_credentials)
+
+    # successful logins give their token back
+    for _ in range(5):
+        assert client.post("/login", json=jim_credentials).status_code == 200
+
+    # failed ones don't, until the email is throttled
+    wrong = {"email": "JOHN@gmail.com", "password": "wrong"}
+    for _ in range(3):
+        assert client.post("/login", json=wrong).status_code == 400
+    queries.clear()
+    verified.clear()
+    response = client.post("/login", json=john_credentials)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    # rejected before the database and bcrypt
+    assert queries == []
+    assert verified == []
+
+    # unknown emails are verified against a dummy hash all the same
+    unknown = {"email": "nobody@gmail.com", "password": "nobody"}
+    assert client.post("/login", json=unknown).status_code == 400
+    assert verified == ["nobody"]
+
+    # and every client IP has its own bucket
+    login_limiter.store.clear()
+    monkeypatch.setattr(login_limiter, "ip_burst", 2)
+    assert client.post("/login", json=unknown).status_code == 400
+    assert client.post("/login", json=jim_credentials).status_code == 200
+    assert client.post("/login", json=jim_credentials).status_code == 429
+
+
+def test_migrate_scores_to_array(db_url):
+    # the test database is already migrated, start from an empty one
+    server = create_engine(db_url, isolation_level="AUTOCOMMIT")
+    server.execute("CREATE DATABASE migrations")
+    server.dispose()
+    engine = create_engine(f"{db_url}/migrations")
+    migrate(engine, "9f1e3c6b2d47")
+    engine.execute(
+        """
+        INSERT INTO "user" (id, email, password) VALUES
+            ('00000000-0000-0000-0000-000000000001', 'john@gmail.com', ''),
+            ('00000000-0000-0000-0000-000000000005', 'jim@gmail.com', '');
+        INSERT INTO quiz (id, owner, name, published)
+        VALUES ('00000000-0000-0000-0000-000000000002',
+                '00000000-0000-0000-0000-000000000001', 'Quiz', true);
+        INSERT INTO solution (id, "user", quiz, scores) VALUES
+            -- written as a JSON encoded string inside the JSONB column
+            ('00000000-0000-0000-0000-000000000003',
+             '00000000-0000-0000-0000-000000000001',
+             '00000000-0000-0000-0000-000000000002', to_jsonb('[1.0, -0.5, 0.25]'::text)),
+            -- and as a plain JSON array
+            ('00000000-0000-0000-0000-000000000004',
+             '00000000-0000-0000-0000-000000000005',
+             '00000000-0000-0000-0000-000000000002', '[0.5, 0.0]'::jsonb);
+        """
+    )
+
+    migrate(engine, "c47a9d0e5f12")
+    rows = engine.execute("SELECT scores, total_score FROM solution ORDER BY id").fetchall()
+    assert [list(r.scores) for r in rows] == [[1.0, -0.5, 0.25], [0.5, 0.0]]
+    assert [r.total_score for r in rows] == [approx(0.25), approx(0.25)]
+
+    # the downgrade restores the old encoding
+    migrate(engine, "9f1e3c6b2d47", downgrade=True)
+    rows = engine.execute("SELECT scores FROM solution ORDER BY id").fetchall()
+    assert [json.loads(r.scores) for r in rows] == [[1.0, -0.5, 0.25], [0.5, 0.0]]
+    engine.dispose()
@@ -1,9 +1,12 @@
 import os
 from datetime import datetime, timedelta
-from typing import Any, Union
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Union
 
 from jose import jwt
-from passlib.context import CryptContext
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 90
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
@@ -11,18 +14,32 @@ ALGORITHM = "HS256"
 JWT_SECRET_KEY = os.environ["JWT_SECRET_KEY"]
 JWT_REFRESH_SECRET_KEY = os.environ["JWT_REFRESH_SECRET_KEY"]
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache(maxsize=None)
+def get_password_context() -> "CryptContext":
+    # passlib and the bcrypt backend are only loaded by the first hash or verify
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+@lru_cache(maxsize=None)
+def dummy_password_hash() -> str:
+    """A hash no password matches, to verify against when there is no user."""
+    return get_hashed_password(os.urandom(16).hex())
 
 
 def get_hashed_password(password: str) -> str:
-    return password_context.hash(password)
+    return get_password_context().hash(password)
 
 
 def verify_password(password: str, hashed_pass: str) -> bool:
-    return password_context.verify(password, hashed_pass)
+    return get_password_context().verify(password, hashed_pass)
 
 
-def create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def create_access_token(
+    subject: Union[str, Any], expires_delta: int = None, claims: Dict[str, Any] = None
+) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
@@ -30,13 +47,15 @@ def create_access_token(subject: Union[str, Any], expires_delta: int = None) ->
             minutes=ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expires_delta, "sub": str(subject)}
     # For a safer system, should really be using salting here
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
 
-def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def create_refresh_token(
+    subject: Union[str, Any], expires_delta: int = None, claims: Dict[str, Any] = None
+) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
@@ -44,6 +63,6 @@ def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) ->
             minutes=REFRESH_TOKEN_EXPIRE_MINUTES
         )
 
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expires_delta, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
     return encoded_jwt